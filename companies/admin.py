@@ -1,20 +1,33 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from django.utils.safestring import mark_safe
 from django.urls import reverse
-from .models import Company, CompanyMembership, ActiveCompany
+from django.db.models import Count
+from .models import Company, CompanyMembership, ActiveCompany, COMPANY_HEAVY_FIELDS
+
+_CONNECTED_HTML = mark_safe('<span style="color: green;">✓ Connected</span>')
+_DISCONNECTED_HTML = mark_safe('<span style="color: red;">✗ Disconnected</span>')
 
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "qb_company_name", "realm_id", "connection_status", "currency_display", "member_count","invoice_template_id", "created_by", "created_at")
     list_filter = ("is_connected_db", "currency_code", "created_at")
-    search_fields = ("name", "qb_company_name", "realm_id", "created_by__email")
+    search_fields = ("name", "qb_company_name", "realm_id", "^created_by__email")
     ordering = ("-created_at",)
+    list_select_related = ("created_by",)
     readonly_fields = ("created_at", "updated_at", "connection_status_display", "token_expiry_display")
 
+    def get_queryset(self, request):
+        # Count memberships in the changelist query instead of one COUNT per row
+        qs = super().get_queryset(request).annotate(_member_count=Count('memberships'))
+        match = request.resolver_match
+        if match and match.url_name == "companies_company_changelist":
+            # The changelist never renders the JSON/TEXT blobs
+            qs = qs.defer(*COMPANY_HEAVY_FIELDS)
+        return qs
+
     def connection_status(self, obj):
-        if obj.is_connected:
-            return format_html('<span style="color: green;">✓ Connected</span>')
-        return format_html('<span style="color: red;">✗ Disconnected</span>')
+        return _CONNECTED_HTML if obj.is_connected else _DISCONNECTED_HTML
     connection_status.short_description = "Status"
 
     def connection_status_display(self, obj):
@@ -28,7 +41,7 @@ class CompanyAdmin(admin.ModelAdmin):
     currency_display.short_description = "Currency"
 
     def member_count(self, obj):
-        count = CompanyMembership.objects.filter(company=obj).count()
+        count = obj._member_count
         if count > 0:
             # FIX: Use companies app URL
             url = reverse('admin:companies_companymembership_changelist') + f'?company__id__exact={obj.id}'
@@ -68,6 +81,7 @@ class CompanyMembershipAdmin(admin.ModelAdmin):
     list_filter = ("role", "is_default")
     search_fields = ("user__email", "company__name", "company__realm_id")
     raw_id_fields = ("user", "company")
+    list_select_related = ("user", "company")
 
 
 @admin.register(ActiveCompany)
@@ -76,4 +90,5 @@ class ActiveCompanyAdmin(admin.ModelAdmin):
     list_filter = ("last_updated",)
     search_fields = ("user__email", "company__name", "company__realm_id")
     raw_id_fields = ("user", "company")
+    list_select_related = ("user", "company")
     ordering = ("-last_updated",)
\ No newline at end of file
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0003_activecompany_companies_a_last_up_84b9d9_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='companymembership',
+            index=models.Index(fields=['company', 'user', 'role'], name='companies_c_company_57e555_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def clear_duplicate_defaults(apps, schema_editor):
+    """
+    Keep one is_default membership per user so the constraint can be added:
+    the one for the user's active company, otherwise the one for the most
+    recently created company (memberships carry no timestamp of their own).
+    """
+    CompanyMembership = apps.get_model('companies', 'CompanyMembership')
+    ActiveCompany = apps.get_model('companies', 'ActiveCompany')
+    defaults = CompanyMembership.objects.filter(is_default=True)
+    user_ids = list(
+        defaults.order_by().values('user_id').annotate(
+            default_count=models.Count('id')
+        ).filter(default_count__gt=1).values_list('user_id', flat=True)
+    )
+    active_company_ids = dict(
+        ActiveCompany.objects.filter(user_id__in=user_ids).values_list('user_id', 'company_id')
+    )
+    for user_id in user_ids:
+        memberships = list(
+            defaults.filter(user_id=user_id).order_by(
+                '-company__created_at', '-pk'
+            ).values_list('pk', 'company_id')
+        )
+        keep = next(
+            (pk for pk, company_id in memberships if company_id == active_company_ids.get(user_id)),
+            memberships[0][0]
+        )
+        defaults.filter(user_id=user_id).exclude(pk=keep).update(is_default=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_companymembership_companies_c_company_57e555_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_duplicate_defaults, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='companymembership',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('user',), name='uniq_default_membership_per_user'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:31
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0005_companymembership_uniq_default_membership_per_user'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='companymembership',
+            name='companies_c_user_id_ae9f2c_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='companymembership',
+            name='companies_c_company_054520_idx',
+        ),
+    ]
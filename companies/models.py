@@ -1,13 +1,16 @@
 import os
 import uuid
-from datetime import timedelta
-from django.db import models
+import logging
+from datetime import date, timedelta
+from functools import cached_property
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
 from django.utils import timezone
 from common.models import TimeStampModel  
 from django.core.validators import RegexValidator
 
 User = settings.AUTH_USER_MODEL
+logger = logging.getLogger(__name__)
 
 kra_pin_validator = RegexValidator(
     regex=r'^[A-Z]\d{9}[A-Z]$',
@@ -25,6 +28,62 @@ def company_logo_upload_to(instance, filename):
     return os.path.join("logo", company_ident, filename)
 
 
+# Large JSON/TEXT columns that list views never render. access_token stays
+# loaded because is_connected reads it for every row.
+COMPANY_HEAVY_FIELDS = (
+    "qb_company_info",
+    "preferences_data",
+    "qb_address",
+    "customer_communication_addr",
+    "legal_addr",
+    "token_data",
+    "refresh_token",
+)
+
+# Sentinel: leave the field unchanged when QuickBooks omits the parent object
+# (e.g. DefaultTerms); a present parent without the key clears the field
+_KEEP = object()
+
+# (field, (preferences section, *keys), default when the key is missing).
+# Fields are only written when their section is present in the payload.
+PREFERENCE_FIELD_MAP = (
+    # Sales form preferences
+    ("invoice_template_id", ("SalesFormsPrefs", "DefaultInvoiceTemplateRef", "value"), _KEEP),
+    ("invoice_template_name", ("SalesFormsPrefs", "DefaultInvoiceTemplateRef", "name"), _KEEP),
+    ("invoice_logo_enabled", ("SalesFormsPrefs", "AllowInvoiceLogo"), True),
+    ("brand_color", ("SalesFormsPrefs", "BrandingColor"), "#0077C5"),
+    ("auto_invoice_number", ("SalesFormsPrefs", "AutoInvoiceNumber"), False),
+    ("default_payment_terms", ("SalesFormsPrefs", "DefaultTerms", "value"), _KEEP),
+    ("default_delivery_method", ("SalesFormsPrefs", "DefaultDeliveryMethod"), None),
+    ("default_ship_method", ("SalesFormsPrefs", "DefaultShipMethod"), None),
+    # Currency preferences
+    ("currency_code", ("CurrencyPrefs", "HomeCurrency", "value"), "USD"),
+    ("multi_currency_enabled", ("CurrencyPrefs", "MultiCurrencyEnabled"), False),
+    # Tax preferences
+    ("tax_enabled", ("TaxPrefs", "UsingSalesTax"), False),
+    ("tax_calculation", ("TaxPrefs", "TaxGroupCodePref"), "TaxExcluded"),
+    # Feature flags
+    ("time_tracking_enabled", ("OtherPrefs", "TimeTrackingEnabled"), False),
+    ("inventory_enabled", ("OtherPrefs", "InventoryEnabled"), False),
+    ("class_tracking_enabled", ("OtherPrefs", "ClassTrackingPerTxn"), False),
+    ("department_tracking_enabled", ("OtherPrefs", "DepartmentTracking"), False),
+    ("customer_tracking_enabled", ("OtherPrefs", "CustomerTracking"), True),
+    ("vendor_tracking_enabled", ("OtherPrefs", "VendorTracking"), True),
+    # Email preferences
+    ("email_when_sent", ("EmailMessagesPrefs", "InvoiceEmailWhenSent"), False),
+    ("email_when_opened", ("EmailMessagesPrefs", "InvoiceEmailWhenOpened"), False),
+    ("email_when_paid", ("EmailMessagesPrefs", "InvoiceEmailWhenPaid"), False),
+)
+
+
+class CompanyManager(models.Manager):
+    def lite(self):
+        """
+        Companies without the heavy JSON/TEXT columns, for list-style reads.
+        Deferred fields are still loaded on first access.
+        """
+        return self.get_queryset().defer(*COMPANY_HEAVY_FIELDS)
+
 
 class Company(TimeStampModel):
     """
@@ -135,6 +194,8 @@ class Company(TimeStampModel):
         related_name="created_companies"
     )
 
+    objects = CompanyManager()
+
     class Meta:
         indexes = [
             models.Index(fields=["realm_id"]),
@@ -148,41 +209,54 @@ class Company(TimeStampModel):
     def __str__(self):
         return f"{self.name} ({self.realm_id})" if self.realm_id else self.name
 
-    @property
-    def is_connected(self):
+    def is_connected_at(self, now):
         """
-        Returns True if access_token exists and has more than 50 minutes before expiry.
+        Returns True if access_token exists and has more than 5 minutes before expiry at `now`.
         """
         if self.access_token and self.access_token_expires_at:
-            remaining = self.access_token_expires_at - timezone.now()
-            return remaining > timedelta(minutes=5)
+            return self.access_token_expires_at - now > timedelta(minutes=5)
         return False
 
+    @cached_property
+    def is_connected(self):
+        """
+        Connection status as of the first access on this instance.
+        Reset whenever the tokens change through mark_connected/disconnect.
+        """
+        return self.is_connected_at(timezone.now())
+
     def mark_connected(self, token_response: dict):
         """
         Helper: update tokens from QuickBooks token response dict.
         """
-        self.access_token = token_response.get("access_token")
-        self.refresh_token = token_response.get("refresh_token")
+        now = timezone.now()
         expires_in = token_response.get("expires_in")
         refresh_token_expires_in = token_response.get("x_refresh_token_expires_in")
-        
-        if expires_in:
-            self.access_token_expires_at = timezone.now() + timedelta(seconds=int(expires_in))
-        if refresh_token_expires_in:
-            self.refresh_token_expires_at = timezone.now() + timedelta(seconds=int(refresh_token_expires_in))
-            
-        self.token_data = token_response
-        self.is_connected_db = True
-
-        self.save(update_fields=[
-            "access_token",
-            "refresh_token",
-            "access_token_expires_at",
-            "refresh_token_expires_at",
-            "token_data",
-            "is_connected_db",
-        ])
+
+        self._write_token_fields(
+            access_token=token_response.get("access_token"),
+            refresh_token=token_response.get("refresh_token"),
+            access_token_expires_at=(
+                now + timedelta(seconds=int(expires_in))
+                if expires_in else self.access_token_expires_at
+            ),
+            refresh_token_expires_at=(
+                now + timedelta(seconds=int(refresh_token_expires_in))
+                if refresh_token_expires_in else self.refresh_token_expires_at
+            ),
+            token_data=token_response,
+            is_connected_db=True,
+        )
+
+    def _write_token_fields(self, **fields):
+        """
+        Persist token columns with a single UPDATE (no save() cycle or signals)
+        and mirror them on this instance.
+        """
+        type(self).objects.filter(pk=self.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.__dict__.pop("is_connected", None)
 
     def update_company_basic_info(self, company_info: dict):
         """
@@ -206,9 +280,8 @@ class Company(TimeStampModel):
         company_start_date = company_info.get("CompanyStartDate")
         if company_start_date:
             try:
-                from datetime import datetime
                 if isinstance(company_start_date, str):
-                    self.company_start_date = datetime.strptime(company_start_date, '%Y-%m-%d').date()
+                    self.company_start_date = date.fromisoformat(company_start_date)
                 else:
                     self.company_start_date = company_start_date
             except (ValueError, TypeError):
@@ -266,92 +339,45 @@ class Company(TimeStampModel):
         if not preferences_data:
             return
 
-        self.preferences_data = preferences_data
-        
-        # Extract logo first
-        self._extract_logo_from_preferences(preferences_data)
-        
-        # Sales form preferences
-        sales_prefs = preferences_data.get("SalesFormsPrefs", {})
-        if sales_prefs:
-            # Invoice template
-            template_ref = sales_prefs.get("DefaultInvoiceTemplateRef", {})
-            if template_ref:
-                self.invoice_template_id = template_ref.get("value")
-                self.invoice_template_name = template_ref.get("name")
-            
-            # Invoice customization
-            self.invoice_logo_enabled = sales_prefs.get("AllowInvoiceLogo", True)
-            self.brand_color = sales_prefs.get("BrandingColor", "#0077C5")
-            
-            # Invoice numbering and terms
-            self.auto_invoice_number = sales_prefs.get("AutoInvoiceNumber", False)
-            
-            default_terms = sales_prefs.get("DefaultTerms")
-            if default_terms:
-                self.default_payment_terms = default_terms.get("value")
-            
-            # Shipping and delivery
-            self.default_delivery_method = sales_prefs.get("DefaultDeliveryMethod")
-            self.default_ship_method = sales_prefs.get("DefaultShipMethod")
-
-        # Currency preferences
-        currency_prefs = preferences_data.get("CurrencyPrefs", {})
-        if currency_prefs:
-            home_currency = currency_prefs.get("HomeCurrency", {})
-            self.currency_code = home_currency.get("value", "USD")
-            self.multi_currency_enabled = currency_prefs.get("MultiCurrencyEnabled", False)
-
-        # Tax preferences
-        tax_prefs = preferences_data.get("TaxPrefs", {})
-        if tax_prefs:
-            self.tax_enabled = tax_prefs.get("UsingSalesTax", False)
-            self.tax_calculation = tax_prefs.get("TaxGroupCodePref", "TaxExcluded")
-
-        # Other important preferences
-        other_prefs = preferences_data.get("OtherPrefs", {})
-        if other_prefs:
-            # Feature flags
-            self.time_tracking_enabled = other_prefs.get("TimeTrackingEnabled", False)
-            self.inventory_enabled = other_prefs.get("InventoryEnabled", False)
-            self.class_tracking_enabled = other_prefs.get("ClassTrackingPerTxn", False)
-            self.department_tracking_enabled = other_prefs.get("DepartmentTracking", False)
-            
-            # Customer/Vendor tracking
-            self.customer_tracking_enabled = other_prefs.get("CustomerTracking", True)
-            self.vendor_tracking_enabled = other_prefs.get("VendorTracking", True)
-
-        # Email preferences
-        email_prefs = preferences_data.get("EmailMessagesPrefs", {})
-        if email_prefs:
-            self.email_when_sent = email_prefs.get("InvoiceEmailWhenSent", False)
-            self.email_when_opened = email_prefs.get("InvoiceEmailWhenOpened", False)
-            self.email_when_paid = email_prefs.get("InvoiceEmailWhenPaid", False)
-
-        update_fields = [
-            "preferences_data", "currency_code", "multi_currency_enabled",
-            "invoice_template_id", "invoice_template_name", "invoice_logo_enabled", 
-            "brand_color", "auto_invoice_number", "default_payment_terms", 
-            "tax_enabled", "tax_calculation", "time_tracking_enabled", 
-            "inventory_enabled", "class_tracking_enabled", "department_tracking_enabled",
-            "customer_tracking_enabled", "vendor_tracking_enabled", 
-            "default_delivery_method", "default_ship_method", "email_when_sent", 
-            "email_when_opened", "email_when_paid"
-        ]
+        changed = {"preferences_data": preferences_data}
 
-        # Add logo_url if it was updated
-        if hasattr(self, '_logo_url_updated') and self._logo_url_updated:
-            update_fields.append("logo_url")
+        # Resolve SalesFormsPrefs once for both the logo and the field map
+        sales_prefs = preferences_data.get("SalesFormsPrefs") or {}
 
-        self.save(update_fields=update_fields)
-
-    def _extract_logo_from_preferences(self, preferences_data: dict):
+        # Extract logo first
+        self._logo_url_updated = False
+        self._extract_logo_from_preferences(sales_prefs)
+        if self._logo_url_updated:
+            changed["logo_url"] = self.logo_url
+
+        sections = {"SalesFormsPrefs": sales_prefs}
+        for attr, (section_name, *keys), default in PREFERENCE_FIELD_MAP:
+            if section_name not in sections:
+                sections[section_name] = preferences_data.get(section_name)
+            # A missing or empty section leaves its fields untouched
+            node = sections[section_name]
+            if not node:
+                continue
+            *parents, leaf = keys
+            for key in parents:
+                node = node.get(key) if isinstance(node, dict) else None
+            if isinstance(node, dict) and node:
+                node = node.get(leaf, None if default is _KEEP else default)
+            elif default is _KEEP:
+                continue
+            else:
+                node = default
+            changed[attr] = node
+
+        for attr, value in changed.items():
+            setattr(self, attr, value)
+        self.save(update_fields=[*changed, "updated_at"])
+
+    def _extract_logo_from_preferences(self, sales_prefs: dict):
         """
-        Extract logo URL from preferences data
+        Extract logo URL from the SalesFormsPrefs section of preferences data
         """
         try:
-            sales_prefs = preferences_data.get("SalesFormsPrefs", {})
-            
             # Check if logo is allowed
             allow_logo = sales_prefs.get("AllowInvoiceLogo", False)
             if not allow_logo:
@@ -444,21 +470,14 @@ class Company(TimeStampModel):
         """
         Disconnect company from QuickBooks by clearing tokens
         """
-        self.access_token = None
-        self.refresh_token = None
-        self.access_token_expires_at = None
-        self.refresh_token_expires_at = None
-        self.token_data = None
-        self.is_connected_db = False
-        
-        self.save(update_fields=[
-            "access_token",
-            "refresh_token", 
-            "access_token_expires_at",
-            "refresh_token_expires_at",
-            "token_data",
-            "is_connected_db",
-        ])
+        self._write_token_fields(
+            access_token=None,
+            refresh_token=None,
+            access_token_expires_at=None,
+            refresh_token_expires_at=None,
+            token_data=None,
+            is_connected_db=False,
+        )
 
 
 class CompanyMembership(models.Model):
@@ -475,18 +494,56 @@ class CompanyMembership(models.Model):
 
     class Meta:
         unique_together = ("user", "company")
+        # user/company lookups are served by the FK indexes and unique_together
         indexes = [
-            models.Index(fields=["user"]),
-            models.Index(fields=["company"]),
             models.Index(fields=["is_default"]),
+            models.Index(fields=["company", "user", "role"]),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user"],
+                condition=models.Q(is_default=True),
+                name="uniq_default_membership_per_user",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted flag so save() can tell whether it changed
+        instance._loaded_is_default = instance.__dict__.get("is_default")
+        return instance
 
     def save(self, *args, **kwargs):
-        # If this membership becomes default, unset other defaults for this user
-        if self.is_default:
-            CompanyMembership.objects.filter(user=self.user, is_default=True).exclude(pk=self.pk).update(is_default=False)
-        super().save(*args, **kwargs)
+        becomes_default = self.is_default and (
+            self._state.adding or getattr(self, "_loaded_is_default", None) is not True
+        )
+        if not becomes_default:
+            super().save(*args, **kwargs)
+            self._loaded_is_default = self.is_default
+            return
 
+        # If this membership becomes default, unset other defaults for this user.
+        # uniq_default_membership_per_user rejects a concurrent save that slipped
+        # in between; retry once so the latest request wins.
+        for attempt in range(2):
+            with transaction.atomic():
+                other_defaults = CompanyMembership.objects.filter(
+                    user_id=self.user_id, is_default=True
+                ).exclude(pk=self.pk)
+                other_defaults.update(is_default=False)
+                try:
+                    with transaction.atomic():
+                        super().save(*args, **kwargs)
+                except IntegrityError:
+                    # Only a default committed after the update above is a
+                    # default-constraint race; re-raise any other violation
+                    if attempt or not other_defaults.exists():
+                        raise
+                    transaction.set_rollback(True)
+                    continue
+            break
+        self._loaded_is_default = self.is_default
 
 
 class ActiveCompany(models.Model):
@@ -509,6 +566,9 @@ class ActiveCompany(models.Model):
     last_updated = models.DateTimeField(auto_now=True)
 
     class Meta:
+        indexes = [
+            models.Index(fields=["-last_updated"]),
+        ]
         verbose_name = "Active Company"
         verbose_name_plural = "Active Companies"
 
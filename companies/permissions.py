@@ -1,18 +1,33 @@
 from rest_framework import permissions
 
+
+def _membership_exists(request, obj, role=None):
+    """
+    Membership probe memoized on the request per (user, company, role) so
+    repeated object checks within one request hit the database once.
+    """
+    cache = getattr(request, '_membership_cache', None)
+    if cache is None:
+        cache = request._membership_cache = {}
+    key = (request.user.pk, obj.pk, role)
+    if key not in cache:
+        memberships = obj.memberships.filter(user=request.user)
+        if role is not None:
+            memberships = memberships.filter(role=role)
+        cache[key] = memberships.exists()
+    return cache[key]
+
+
 class IsCompanyMember(permissions.BasePermission):
     """Check if user is a member of the company"""
     def has_object_permission(self, request, view, obj):
         if hasattr(obj, 'memberships'):
-            return obj.memberships.filter(user=request.user).exists()
+            return _membership_exists(request, obj)
         return False
 
 class IsCompanyAdmin(permissions.BasePermission):
     """Check if user is an admin of the company"""
     def has_object_permission(self, request, view, obj):
         if hasattr(obj, 'memberships'):
-            return obj.memberships.filter(
-                user=request.user, 
-                role='admin'
-            ).exists()
-        return False
\ No newline at end of file
+            return _membership_exists(request, obj, role='admin')
+        return False
@@ -1,13 +1,14 @@
 from rest_framework import serializers
 from .models import Company, CompanyMembership, ActiveCompany
 from django.conf import settings
+from django.utils import timezone
 
 User = settings.AUTH_USER_MODEL
 
 
 class CompanySerializer(serializers.ModelSerializer):
     """Serializer for Company model - used for read operations"""
-    is_connected = serializers.ReadOnlyField()
+    is_connected = serializers.SerializerMethodField()
     created_by_email = serializers.EmailField(source='created_by.email', read_only=True)
     custom_logo_url = serializers.SerializerMethodField()
     
@@ -33,6 +34,18 @@ class CompanySerializer(serializers.ModelSerializer):
             'invoice_template_id', 'invoice_template_name'
         ]
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Join the rows read by created_by_email so lists don't query per company"""
+        return queryset.select_related('created_by')
+
+    def get_is_connected(self, obj):
+        """Compare against one timestamp shared by every row of the response"""
+        now = self.context.get('now')
+        if now is None:
+            now = self.context['now'] = timezone.now()
+        return obj.is_connected_at(now)
+
     def get_custom_logo_url(self, obj):
         """Return full URL for the uploaded custom logo"""
         request = self.context.get('request')
@@ -78,6 +91,7 @@ class CompanyMembershipSerializer(serializers.ModelSerializer):
     """Serializer for CompanyMembership model"""
     company_name = serializers.CharField(source='company.name', read_only=True)
     user_email = serializers.EmailField(source='user.email', read_only=True)
+    brand_color = serializers.CharField(source='company.brand_color', read_only=True)
     
     class Meta:
         model = CompanyMembership
@@ -1,3 +1,183 @@
-from django.test import TestCase
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, models
+from django.test import TestCase, TransactionTestCase
+
+from .models import ActiveCompany, Company, CompanyMembership
+
+clear_duplicate_defaults = import_module(
+    "companies.migrations.0005_companymembership_uniq_default_membership_per_user"
+).clear_duplicate_defaults
+
+
+class UpdateCompanyPreferencesTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(
+            name="Acme",
+            invoice_template_id="7",
+            invoice_template_name="Modern",
+            default_payment_terms="Net 30",
+        )
+
+    def test_missing_parent_objects_keep_existing_values(self):
+        self.company.update_company_preferences({"SalesFormsPrefs": {"AutoInvoiceNumber": True}})
+
+        self.company.refresh_from_db()
+        self.assertEqual(self.company.invoice_template_id, "7")
+        self.assertEqual(self.company.invoice_template_name, "Modern")
+        self.assertEqual(self.company.default_payment_terms, "Net 30")
+        self.assertTrue(self.company.auto_invoice_number)
+
+    def test_parent_objects_without_keys_clear_fields(self):
+        self.company.update_company_preferences({
+            "SalesFormsPrefs": {
+                "DefaultInvoiceTemplateRef": {"value": "9"},
+                "DefaultTerms": {"name": "Net 15"},
+            }
+        })
+
+        self.company.refresh_from_db()
+        self.assertEqual(self.company.invoice_template_id, "9")
+        self.assertIsNone(self.company.invoice_template_name)
+        self.assertIsNone(self.company.default_payment_terms)
+
+    def test_missing_section_leaves_its_fields_untouched(self):
+        self.company.update_company_preferences({"CurrencyPrefs": {"MultiCurrencyEnabled": True}})
+
+        self.company.refresh_from_db()
+        self.assertEqual(self.company.currency_code, "USD")
+        self.assertTrue(self.company.multi_currency_enabled)
+        self.assertEqual(self.company.invoice_template_name, "Modern")
+
+    def test_updates_go_through_save(self):
+        before = self.company.updated_at
+
+        self.company.update_company_preferences({"TaxPrefs": {"UsingSalesTax": True}})
+
+        self.company.refresh_from_db()
+        self.assertTrue(self.company.tax_enabled)
+        self.assertGreater(self.company.updated_at, before)
+
+
+class CompanyMembershipDefaultTests(TestCase):
+    def setUp(self):
+        # The user signal creates a default company and membership
+        self.user = get_user_model().objects.create_user(email="owner@example.com", password="x")
+        self.first = CompanyMembership.objects.get(user=self.user, is_default=True)
+        self.second = CompanyMembership.objects.create(
+            user=self.user, company=Company.objects.create(name="Second")
+        )
+
+    def test_switching_default_clears_the_previous_one(self):
+        self.second.is_default = True
+        self.second.save()
+
+        self.first.refresh_from_db()
+        self.assertFalse(self.first.is_default)
+        self.assertEqual(
+            list(CompanyMembership.objects.filter(user=self.user, is_default=True)),
+            [self.second],
+        )
+
+    def test_concurrent_default_is_resolved_by_retry(self):
+        third = CompanyMembership.objects.create(
+            user=self.user, company=Company.objects.create(name="Third")
+        )
+        queryset_update = models.QuerySet.update
+        calls = []
+
+        def racing_update(queryset, **kwargs):
+            calls.append(kwargs)
+            rows = queryset_update(queryset, **kwargs)
+            if len(calls) == 1:
+                # Another request commits its default between our update and save
+                queryset_update(CompanyMembership.objects.filter(pk=third.pk), is_default=True)
+            return rows
+
+        self.second.is_default = True
+        with mock.patch.object(models.QuerySet, "update", autospec=True, side_effect=racing_update):
+            self.second.save()
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(
+            list(CompanyMembership.objects.filter(user=self.user, is_default=True)),
+            [self.second],
+        )
+
+    def test_unrelated_integrity_error_is_not_retried(self):
+        duplicate = CompanyMembership(user=self.user, company=self.second.company, is_default=True)
+        model_save = models.Model.save
+        calls = []
+
+        def counting_save(instance, *args, **kwargs):
+            calls.append(instance.pk)
+            return model_save(instance, *args, **kwargs)
+
+        with mock.patch.object(models.Model, "save", autospec=True, side_effect=counting_save):
+            with self.assertRaises(IntegrityError):
+                duplicate.save()
+
+        self.assertEqual(len(calls), 1)
+        self.first.refresh_from_db()
+        self.assertTrue(self.first.is_default)
+
+
+class ClearDuplicateDefaultsMigrationTests(TransactionTestCase):
+    def setUp(self):
+        # Rows written before the constraint existed may hold several defaults
+        self.constraint = next(
+            constraint for constraint in CompanyMembership._meta.constraints
+            if constraint.name == "uniq_default_membership_per_user"
+        )
+        with connection.schema_editor() as editor:
+            editor.remove_constraint(CompanyMembership, self.constraint)
+        self.addCleanup(self._restore_constraint)
+
+    def _restore_constraint(self):
+        CompanyMembership.objects.update(is_default=False)
+        with connection.schema_editor() as editor:
+            editor.add_constraint(CompanyMembership, self.constraint)
+
+    def _user_with_defaults(self, email, count):
+        # The user signal creates the first default membership
+        user = get_user_model().objects.create_user(email=email, password="x")
+        memberships = [CompanyMembership.objects.get(user=user)]
+        for i in range(count - 1):
+            memberships.append(CompanyMembership.objects.create(
+                user=user, company=Company.objects.create(name=f"{email} {i}")
+            ))
+        CompanyMembership.objects.filter(user=user).update(is_default=True)
+        return user, memberships
+
+    def _defaults(self, user):
+        return list(CompanyMembership.objects.filter(user=user, is_default=True))
+
+    def test_keeps_the_active_company_membership(self):
+        user, memberships = self._user_with_defaults("active@example.com", 3)
+        ActiveCompany.objects.create(user=user, company=memberships[1].company)
+
+        clear_duplicate_defaults(apps, None)
+
+        self.assertEqual(self._defaults(user), [memberships[1]])
+
+    def test_keeps_the_newest_company_membership_without_active_company(self):
+        user, memberships = self._user_with_defaults("newest@example.com", 3)
+
+        clear_duplicate_defaults(apps, None)
+
+        self.assertEqual(self._defaults(user), [memberships[-1]])
+
+    def test_leaves_single_defaults_alone_and_allows_the_constraint(self):
+        single_user, [single] = self._user_with_defaults("single@example.com", 1)
+        duplicated_user, _ = self._user_with_defaults("duplicated@example.com", 2)
+
+        clear_duplicate_defaults(apps, None)
+
+        self.assertEqual(self._defaults(single_user), [single])
+        self.assertEqual(len(self._defaults(duplicated_user)), 1)
+        with connection.schema_editor() as editor:
+            editor.add_constraint(CompanyMembership, self.constraint)
+            editor.remove_constraint(CompanyMembership, self.constraint)
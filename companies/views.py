@@ -3,7 +3,10 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
-from .models import Company, CompanyMembership, ActiveCompany
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .models import Company, CompanyMembership, ActiveCompany, COMPANY_HEAVY_FIELDS
 from .serializers import (
     CompanySerializer, 
     CompanyCreateSerializer, 
@@ -14,6 +17,11 @@ from .serializers import (
 from users.models import User
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
+# Heavy Company columns that CompanySerializer never renders
+COMPANY_READ_DEFERRED_FIELDS = tuple(
+    field for field in COMPANY_HEAVY_FIELDS if field not in CompanySerializer.Meta.fields
+)
+
 class CompanyViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing companies.
@@ -21,38 +29,63 @@ class CompanyViewSet(viewsets.ModelViewSet):
     """
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser, JSONParser] 
+    serializer_action_classes = {
+        'create': CompanyCreateSerializer,
+        'update': CompanyUpdateSerializer,
+        'partial_update': CompanyUpdateSerializer,
+    }
     
     def get_queryset(self):
         """Return companies that the user is a member of"""
-        return Company.objects.filter(
-            memberships__user=self.request.user
-        ).distinct().select_related('created_by')
+        # Semi-join on the user's memberships; no JOIN row multiplication to DISTINCT away
+        queryset = CompanySerializer.setup_eager_loading(
+            Company.objects.filter(
+                id__in=CompanyMembership.objects.filter(user=self.request.user).values('company_id')
+            )
+        )
+        if self.action in ['list', 'retrieve']:
+            queryset = queryset.defer(*COMPANY_READ_DEFERRED_FIELDS)
+        if self.action != 'list':
+            # Lets detail actions check admin rights without another query
+            queryset = queryset.annotate(
+                current_user_is_admin=Exists(
+                    CompanyMembership.objects.filter(
+                        company=OuterRef('pk'), user=self.request.user, role='admin'
+                    )
+                )
+            )
+        return queryset
     
     def get_serializer_class(self):
         """Return appropriate serializer based on action"""
-        if self.action == 'create':
-            return CompanyCreateSerializer
-        elif self.action in ['update', 'partial_update']:
-            return CompanyUpdateSerializer
-        return CompanySerializer
+        return self.serializer_action_classes.get(self.action, CompanySerializer)
     
     def perform_create(self, serializer):
         """Create company and automatically add user as admin member"""
-        company = serializer.save()
-        
-        # Create membership for the creator as admin
-        CompanyMembership.objects.create(
-            user=self.request.user,
-            company=company,
-            is_default=True,
-            role='admin'
-        )
-        
-        # Set as active company
-        ActiveCompany.objects.update_or_create(
-            user=self.request.user,
-            defaults={'company': company}
-        )
+        with transaction.atomic():
+            company = serializer.save()
+            
+            # bulk_create skips CompanyMembership.save(), so clear the creator's
+            # previous default here before inserting the new default membership
+            CompanyMembership.objects.filter(
+                user=self.request.user, is_default=True
+            ).update(is_default=False)
+            
+            # Create membership for the creator as admin (invitees can join this batch)
+            CompanyMembership.objects.bulk_create([
+                CompanyMembership(
+                    user=self.request.user,
+                    company=company,
+                    is_default=True,
+                    role='admin'
+                ),
+            ])
+            
+            # Set as active company
+            ActiveCompany.objects.update_or_create(
+                user=self.request.user,
+                defaults={'company': company}
+            )
     
     @action(detail=True, methods=['post'])
     def add_member(self, request, pk=None):
@@ -60,7 +93,7 @@ class CompanyViewSet(viewsets.ModelViewSet):
         company = self.get_object()
         
         # Check if current user is admin of the company
-        if not company.memberships.filter(user=request.user, role='admin').exists():
+        if not company.current_user_is_admin:
             return Response(
                 {'error': 'Only company admins can add members'},
                 status=status.HTTP_403_FORBIDDEN
@@ -73,27 +106,39 @@ class CompanyViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # Look up the user and whether they already belong to the company in one query
         try:
-            user_to_add = User.objects.get(email=user_email)
+            user_to_add = User.objects.annotate(
+                is_member=Exists(
+                    CompanyMembership.objects.filter(company=company, user=OuterRef('pk'))
+                )
+            ).get(email=user_email)
         except User.DoesNotExist:
             return Response(
                 {'error': 'User with this email does not exist'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Check if user is already a member
-        if company.memberships.filter(user=user_to_add).exists():
+        if user_to_add.is_member:
             return Response(
                 {'error': 'User is already a member of this company'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        membership = CompanyMembership.objects.create(
-            user=user_to_add,
-            company=company,
-            role=request.data.get('role', 'member'),
-            is_default=request.data.get('is_default', False)
-        )
+        try:
+            with transaction.atomic():
+                membership = CompanyMembership.objects.create(
+                    user=user_to_add,
+                    company=company,
+                    role=request.data.get('role', 'member'),
+                    is_default=request.data.get('is_default', False)
+                )
+        except IntegrityError:
+            # Added concurrently after the lookup above
+            return Response(
+                {'error': 'User is already a member of this company'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         serializer = CompanyMembershipSerializer(membership)
         return Response({
@@ -116,10 +161,12 @@ class CompanyViewSet(viewsets.ModelViewSet):
         # This would use the access token to fetch latest company info
         # and call company.update_company_info()
         
+        # get_object() already joined created_by (setup_eager_loading), so the
+        # serializer pass loads nothing further
         return Response({
             'success': True,
             'message': 'Company info refreshed successfully',
-            'company': CompanySerializer(company).data
+            'company': CompanySerializer(company, context=self.get_serializer_context()).data
         })
 
     
@@ -138,7 +185,7 @@ class CompanyViewSet(viewsets.ModelViewSet):
         """Get companies with membership info for current user"""
         memberships = CompanyMembership.objects.filter(
             user=request.user
-        ).select_related('company')
+        ).select_related('company', 'user')
         
         serializer = CompanyMembershipSerializer(memberships, many=True)
         return Response(serializer.data)
@@ -153,7 +200,7 @@ class CompanyMembershipViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Users can only see their own memberships"""
-        return CompanyMembership.objects.filter(user=self.request.user)
+        return CompanyMembership.objects.filter(user=self.request.user).select_related('company', 'user')
     
     def perform_create(self, serializer):
         """Ensure user is set to current user"""
@@ -168,7 +215,9 @@ class ActiveCompanyViewSet(viewsets.ModelViewSet):
     serializer_class = ActiveCompanySerializer
     
     def get_queryset(self):
-        return ActiveCompany.objects.filter(user=self.request.user)
+        return ActiveCompany.objects.filter(user=self.request.user).select_related(
+            'company', 'company__created_by'
+        ).defer(*(f'company__{field}' for field in COMPANY_READ_DEFERRED_FIELDS))
     
     def get_object(self):
         """Get or create active company for user"""
@@ -188,22 +237,26 @@ class ActiveCompanyViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Verify user has access to the company
-        try:
-            company = Company.objects.get(
-                id=company_id,
-                memberships__user=request.user
-            )
-        except Company.DoesNotExist:
-            return Response(
-                {'error': 'Company not found or access denied'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        active_company, created = ActiveCompany.objects.update_or_create(
-            user=request.user,
-            defaults={'company': company}
+        # Switch the active company only if the user is a member, in one UPDATE
+        is_member = Exists(
+            CompanyMembership.objects.filter(user=request.user, company_id=company_id)
         )
+        updated = ActiveCompany.objects.filter(user=request.user).filter(is_member).update(
+            company_id=company_id, last_updated=timezone.now()
+        )
+        
+        if not updated:
+            # Either the user has no active company row yet or access is denied
+            if not CompanyMembership.objects.filter(user=request.user, company_id=company_id).exists():
+                return Response(
+                    {'error': 'Company not found or access denied'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            ActiveCompany.objects.update_or_create(
+                user=request.user,
+                defaults={'company_id': company_id}
+            )
         
+        active_company = self.get_queryset().get()
         serializer = self.get_serializer(active_company)
         return Response(serializer.data)
\ No newline at end of file
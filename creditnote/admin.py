@@ -19,6 +19,11 @@ class CreditNoteLineInline(admin.TabularInline):
         'tax_amount',
     )
     ordering = ('line_num',)
+    # raw_data is not edited inline, so don't fetch it for every line
+    exclude = ('raw_data',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('raw_data')
 
 
 @admin.register(CreditNote)
@@ -61,9 +66,18 @@ class CreditNoteAdmin(admin.ModelAdmin):
 
     date_hierarchy = 'txn_date'
     ordering = ('-txn_date',)
+    list_select_related = ('company',)
 
     inlines = [CreditNoteLineInline]
 
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        match = request.resolver_match
+        if match and match.url_name == "creditnote_creditnote_changelist":
+            # raw_data is only shown on the change form
+            qs = qs.defer('raw_data')
+        return qs
+
     fieldsets = (
         (
             'Core Information',
@@ -166,3 +180,4 @@ class CreditNoteLineAdmin(admin.ModelAdmin):
     )
 
     ordering = ('credit_note', 'line_num')
+    list_select_related = ('credit_note',)
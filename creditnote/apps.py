@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CreditnoteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'creditnote'
+
+    def ready(self):
+        import creditnote.signals
@@ -4,9 +4,10 @@ Handles validation logic for linking credit notes to invoices.
 """
 
 from decimal import Decimal
-from typing import Tuple, Dict, Any, Optional
+from typing import Tuple, Dict, Any, Iterable, Optional
 from django.db import transaction
 from django.db import models
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 
 # Import models
@@ -14,6 +15,14 @@ from invoices.models import Invoice
 from creditnote.models import CreditNote
 from companies.models import Company
 
+# Shared Decimal constants, so the hot paths don't re-parse string literals
+_DEC_ZERO = Decimal('0.00')
+_DEC_CENT = Decimal('0.01')  # Fully-credited tolerance
+_DEC_HUNDRED = Decimal('100')
+
+# Linked credit notes beyond this count are streamed rather than loaded at once
+_CREDIT_NOTES_CHUNK_SIZE = 500
+
 
 class CreditNoteValidationError(Exception):
     """Custom exception for credit note validation errors"""
@@ -27,31 +36,18 @@ class CreditNoteValidationService:
     """
     
     @staticmethod
-    def calculate_invoice_credit_summary(invoice: Invoice) -> Dict[str, Any]:
+    def _build_credit_summary(invoice: Invoice, total_credits: Decimal) -> Dict[str, Any]:
         """
-        Calculate credit summary for an invoice.
-        
-        Args:
-            invoice: Invoice instance
-            
-        Returns:
-            Dict: Credit summary information
+        Build the credit summary for an invoice from its total applied credits.
         """
-        # Calculate total credits applied
-        total_credits = CreditNote.objects.filter(
-            related_invoice=invoice
-        ).aggregate(
-            total=models.Sum('total_amt')
-        )['total'] or Decimal('0.00')
-        
         # Calculate available balance
-        available_balance = max(Decimal('0.00'), invoice.total_amt - total_credits)
-        is_fully_credited = available_balance <= Decimal('0.01')
+        available_balance = max(_DEC_ZERO, invoice.total_amt - total_credits)
+        is_fully_credited = available_balance <= _DEC_CENT
         
         # Calculate credit utilization percentage
-        credit_utilization_percentage = Decimal('0.00')
-        if invoice.total_amt > Decimal('0.00'):
-            credit_utilization_percentage = (total_credits / invoice.total_amt) * Decimal('100')
+        credit_utilization_percentage = _DEC_ZERO
+        if invoice.total_amt > _DEC_ZERO:
+            credit_utilization_percentage = (total_credits / invoice.total_amt) * _DEC_HUNDRED
         
         return {
             'calculated_total_credits': total_credits,
@@ -60,11 +56,85 @@ class CreditNoteValidationService:
             'credit_utilization_percentage': credit_utilization_percentage,
         }
     
+    @staticmethod
+    def _annotated_credit_summary(invoice: Invoice) -> Dict[str, Any]:
+        """
+        Build the credit summary for an invoice loaded through
+        Invoice.objects.with_credit_summary(), reading the SQL-computed columns.
+        """
+        total_credits = invoice.calc_total_credits
+        
+        credit_utilization_percentage = _DEC_ZERO
+        if invoice.total_amt > _DEC_ZERO:
+            credit_utilization_percentage = (total_credits / invoice.total_amt) * _DEC_HUNDRED
+        
+        return {
+            'calculated_total_credits': total_credits,
+            'available_credit_balance': invoice.calc_available_balance,
+            'is_fully_credited': invoice.calc_is_fully_credited,
+            'credit_utilization_percentage': credit_utilization_percentage,
+        }
+    
+    @staticmethod
+    def calculate_invoice_credit_summaries(invoices: Iterable[Invoice]) -> Dict[Any, Dict[str, Any]]:
+        """
+        Calculate credit summaries for many invoices with a single aggregate query.
+        
+        Args:
+            invoices: Iterable of Invoice instances
+            
+        Returns:
+            Dict: Credit summary information keyed by invoice id
+        """
+        invoices = list(invoices)
+        if not invoices:
+            return {}
+        
+        # Total credits applied per invoice, in one GROUP BY query
+        credit_totals = dict(
+            CreditNote.objects.filter(
+                related_invoice__in=[invoice.id for invoice in invoices]
+            ).values('related_invoice').annotate(
+                total=models.Sum('total_amt')
+            ).values_list('related_invoice', 'total')
+        )
+        
+        return {
+            invoice.id: CreditNoteValidationService._build_credit_summary(
+                invoice, credit_totals.get(invoice.id) or _DEC_ZERO
+            )
+            for invoice in invoices
+        }
+    
+    @staticmethod
+    def calculate_invoice_credit_summary(invoice: Invoice) -> Dict[str, Any]:
+        """
+        Calculate credit summary for an invoice.
+        The result is memoized on the instance; delete invoice._credit_summary
+        after changing the invoice's credit notes.
+        
+        Args:
+            invoice: Invoice instance
+            
+        Returns:
+            Dict: Credit summary information
+        """
+        summary = getattr(invoice, '_credit_summary', None)
+        if summary is None:
+            if hasattr(invoice, 'calc_total_credits'):
+                # Already computed by Invoice.objects.with_credit_summary()
+                summary = CreditNoteValidationService._annotated_credit_summary(invoice)
+            else:
+                summary = CreditNoteValidationService.calculate_invoice_credit_summaries([invoice])[invoice.id]
+            invoice._credit_summary = summary
+        return summary
+    
     @staticmethod
     def validate_credit_amount(
         credit_note_amount: Decimal, 
         invoice_id: str,
-        company_id: Optional[str] = None
+        company_id: Optional[str] = None,
+        invoice: Optional[Invoice] = None
     ) -> Tuple[bool, str, Dict[str, Any]]:
         """
         Validate if credit note amount can be applied to invoice.
@@ -73,67 +143,65 @@ class CreditNoteValidationService:
             credit_note_amount: Amount of the credit note
             invoice_id: ID of the target invoice
             company_id: Optional company ID for additional validation
+            invoice: Optional already-loaded target invoice; skips the lookup
             
         Returns:
-            Tuple[bool, str, Dict]: (is_valid, error_message, details)
+            Tuple[bool, str, Dict]: (is_valid, error_message, details);
+            amounts in details are Decimals, formatted by the JSON renderer
         """
-        try:
-            # Get the invoice
+        # Get the invoice, with its credit summary computed in the same query
+        if invoice is None:
             try:
-                invoice = Invoice.objects.select_related('company').get(id=invoice_id)
-            except Invoice.DoesNotExist:
+                invoice = Invoice.objects.with_credit_summary().get(id=invoice_id)
+            except (Invoice.DoesNotExist, ValidationError):
                 return False, f"Invoice not found with ID: {invoice_id}", {}
-            
-            # Optional company validation
-            if company_id and str(invoice.company.id) != str(company_id):
-                return False, f"Invoice does not belong to company {company_id}", {}
-            
-            # Basic validation
-            if credit_note_amount <= Decimal('0.00'):
-                return False, "Credit note amount must be greater than zero", {}
-            
-            # Calculate credit summary
-            summary = CreditNoteValidationService.calculate_invoice_credit_summary(invoice)
-            
-            # Check if invoice is fully credited
-            if summary['is_fully_credited']:
-                details = {
-                    'invoice_number': invoice.doc_number,
-                    'invoice_total': float(invoice.total_amt),
-                    'calculated_total_credits': float(summary['calculated_total_credits']),
-                    'available_balance': float(summary['available_credit_balance']),
-                }
-                return False, f"Invoice {invoice.doc_number} is already fully credited", details
-            
-            # Check if credit amount is available
-            if credit_note_amount > summary['available_credit_balance']:
-                available_balance = summary['available_credit_balance']
-                details = {
-                    'invoice_number': invoice.doc_number,
-                    'invoice_total': float(invoice.total_amt),
-                    'calculated_total_credits': float(summary['calculated_total_credits']),
-                    'available_balance': float(available_balance),
-                    'requested_amount': float(credit_note_amount),
-                    'shortfall': float(credit_note_amount - available_balance),
-                }
-                return False, f"Credit amount ({credit_note_amount}) exceeds available balance ({available_balance})", details
-            
-            # Success - return details
+        
+        # Optional company validation
+        if company_id and str(invoice.company_id) != str(company_id):
+            return False, f"Invoice does not belong to company {company_id}", {}
+        
+        # Basic validation
+        if credit_note_amount <= _DEC_ZERO:
+            return False, "Credit note amount must be greater than zero", {}
+        
+        # Calculate credit summary
+        summary = CreditNoteValidationService.calculate_invoice_credit_summary(invoice)
+        
+        # Check if invoice is fully credited
+        if summary['is_fully_credited']:
             details = {
                 'invoice_number': invoice.doc_number,
-                'invoice_total': float(invoice.total_amt),
-                'calculated_total_credits': float(summary['calculated_total_credits']),
-                'available_balance': float(summary['available_credit_balance']),
-                'requested_amount': float(credit_note_amount),
-                'remaining_balance_after': float(summary['available_credit_balance'] - credit_note_amount),
-                'is_valid': True,
+                'invoice_total': invoice.total_amt,
+                'calculated_total_credits': summary['calculated_total_credits'],
+                'available_balance': summary['available_credit_balance'],
             }
-            
-            return True, f"Credit note of ${credit_note_amount} can be applied to invoice {invoice.doc_number}", details
-            
-        except Exception as e:
-            error_msg = f"Validation error: {str(e)}"
-            return False, error_msg, {}
+            return False, f"Invoice {invoice.doc_number} is already fully credited", details
+        
+        # Check if credit amount is available
+        if credit_note_amount > summary['available_credit_balance']:
+            available_balance = summary['available_credit_balance']
+            details = {
+                'invoice_number': invoice.doc_number,
+                'invoice_total': invoice.total_amt,
+                'calculated_total_credits': summary['calculated_total_credits'],
+                'available_balance': available_balance,
+                'requested_amount': credit_note_amount,
+                'shortfall': credit_note_amount - available_balance,
+            }
+            return False, f"Credit amount ({credit_note_amount}) exceeds available balance ({available_balance})", details
+        
+        # Success - return details
+        details = {
+            'invoice_number': invoice.doc_number,
+            'invoice_total': invoice.total_amt,
+            'calculated_total_credits': summary['calculated_total_credits'],
+            'available_balance': summary['available_credit_balance'],
+            'requested_amount': credit_note_amount,
+            'remaining_balance_after': summary['available_credit_balance'] - credit_note_amount,
+            'is_valid': True,
+        }
+        
+        return True, f"Credit note of ${credit_note_amount} can be applied to invoice {invoice.doc_number}", details
     
     @staticmethod
     @transaction.atomic
@@ -156,46 +224,52 @@ class CreditNoteValidationService:
         try:
             # Use select_for_update to prevent concurrent modifications
             invoice = Invoice.objects.select_for_update().get(id=invoice_id)
-            
-            if not skip_validation:
-                # Validate before linking
-                is_valid, error, details = CreditNoteValidationService.validate_credit_amount(
-                    credit_note.total_amt, 
-                    invoice_id,
-                    str(credit_note.company.id) if credit_note.company else None
-                )
-                
-                if not is_valid:
-                    return False, error, details
-            
-            # Link the credit note
-            credit_note.related_invoice = invoice
-            credit_note.save(update_fields=['related_invoice', 'updated_at'])
-            
-            # Calculate updated summary
-            summary = CreditNoteValidationService.calculate_invoice_credit_summary(invoice)
-            
-            # Get updated details
-            details = {
-                'credit_note_id': str(credit_note.id),
-                'credit_note_number': credit_note.doc_number,
-                'credit_note_amount': float(credit_note.total_amt),
-                'invoice_id': str(invoice.id),
-                'invoice_number': invoice.doc_number,
-                'invoice_total': float(invoice.total_amt),
-                'total_credits_before': float(summary['calculated_total_credits'] - credit_note.total_amt),
-                'total_credits_after': float(summary['calculated_total_credits']),
-                'available_balance_before': float(summary['available_credit_balance'] + credit_note.total_amt),
-                'available_balance_after': float(summary['available_credit_balance']),
-                'link_successful': True,
-            }
-            
-            return True, f"Successfully linked credit note to invoice {invoice.doc_number}", details
-            
-        except Invoice.DoesNotExist:
+        except (Invoice.DoesNotExist, ValidationError):
             return False, f"Invoice not found with ID: {invoice_id}", {}
-        except Exception as e:
-            return False, f"Failed to link credit note: {str(e)}", {}
+        
+        if not skip_validation:
+            # Validate before linking
+            is_valid, error, details = CreditNoteValidationService.validate_credit_amount(
+                credit_note.total_amt, 
+                invoice_id,
+                str(credit_note.company_id) if credit_note.company_id else None,
+                invoice=invoice
+            )
+            
+            if not is_valid:
+                return False, error, details
+        
+        # Link the credit note with a plain UPDATE; it skips the CreditNote save
+        # signals, so refresh the stored balances of both invoices here
+        updated_at = timezone.now()
+        CreditNote.objects.filter(pk=credit_note.pk).update(
+            related_invoice=invoice, updated_at=updated_at
+        )
+        Invoice.objects.refresh_available_balances([credit_note.related_invoice_id, invoice.pk])
+        credit_note._loaded_related_invoice_id = invoice.pk
+        credit_note.related_invoice = invoice
+        credit_note.updated_at = updated_at
+        
+        # Calculate updated summary (the memoized one predates the link)
+        invoice.__dict__.pop('_credit_summary', None)
+        summary = CreditNoteValidationService.calculate_invoice_credit_summary(invoice)
+        
+        # Get updated details
+        details = {
+            'credit_note_id': str(credit_note.id),
+            'credit_note_number': credit_note.doc_number,
+            'credit_note_amount': float(credit_note.total_amt),
+            'invoice_id': str(invoice.id),
+            'invoice_number': invoice.doc_number,
+            'invoice_total': float(invoice.total_amt),
+            'total_credits_before': float(summary['calculated_total_credits'] - credit_note.total_amt),
+            'total_credits_after': float(summary['calculated_total_credits']),
+            'available_balance_before': float(summary['available_credit_balance'] + credit_note.total_amt),
+            'available_balance_after': float(summary['available_credit_balance']),
+            'link_successful': True,
+        }
+        
+        return True, f"Successfully linked credit note to invoice {invoice.doc_number}", details
     
     @staticmethod
     def validate_credit_note_update(
@@ -216,36 +290,24 @@ class CreditNoteValidationService:
         """
         try:
             credit_note = CreditNote.objects.get(id=credit_note_id)
-            current_invoice = credit_note.related_invoice
-            
-            # Determine which invoice to validate against
-            target_invoice_id = new_invoice_id or (current_invoice.id if current_invoice else None)
-            amount_to_validate = new_amount or credit_note.total_amt
-            
-            if not target_invoice_id:
-                return True, "No invoice specified, validation not required", {}
-            
-            # If changing invoice, we need to validate against the new invoice
-            if new_invoice_id and current_invoice and str(new_invoice_id) != str(current_invoice.id):
-                # We're moving to a different invoice
-                # First, check if the new invoice can accept the credit
-                return CreditNoteValidationService.validate_credit_amount(
-                    amount_to_validate,
-                    new_invoice_id,
-                    str(credit_note.company.id) if credit_note.company else None
-                )
-            else:
-                # Same invoice, just checking if amount change is valid
-                return CreditNoteValidationService.validate_credit_amount(
-                    amount_to_validate,
-                    target_invoice_id,
-                    str(credit_note.company.id) if credit_note.company else None
-                )
-                
-        except CreditNote.DoesNotExist:
+        except (CreditNote.DoesNotExist, ValidationError):
             return False, f"Credit note not found with ID: {credit_note_id}", {}
-        except Exception as e:
-            return False, f"Validation error: {str(e)}", {}
+        
+        if new_invoice_id is None and new_amount is None:
+            return True, "No change", {}
+        
+        # Validate against the new invoice if one is given, otherwise the current one
+        target_invoice_id = new_invoice_id or credit_note.related_invoice_id
+        amount_to_validate = new_amount or credit_note.total_amt
+        
+        if not target_invoice_id:
+            return True, "No invoice specified, validation not required", {}
+        
+        return CreditNoteValidationService.validate_credit_amount(
+            amount_to_validate,
+            target_invoice_id,
+            str(credit_note.company_id) if credit_note.company_id else None
+        )
     
     @staticmethod
     def get_invoice_credit_summary(invoice_id: str) -> Dict[str, Any]:
@@ -259,46 +321,47 @@ class CreditNoteValidationService:
             Dict: Credit summary information
         """
         try:
-            # Get the invoice
-            invoice = Invoice.objects.get(id=invoice_id)
-            
-            # Calculate credit summary
-            summary = CreditNoteValidationService.calculate_invoice_credit_summary(invoice)
-            
-            # Get all linked credit notes
-            credit_notes = CreditNote.objects.filter(
-                related_invoice=invoice
-            ).order_by('-txn_date')
-            
-            credit_notes_data = [
-                {
-                    'id': str(cn.id),
-                    'doc_number': cn.doc_number,
-                    'txn_date': cn.txn_date.isoformat(),
-                    'amount': float(cn.total_amt),
-                    'customer_name': cn.customer_name,
-                }
-                for cn in credit_notes
-            ]
-            
-            # Build complete summary
-            result = {
-                'invoice_id': str(invoice.id),
-                'invoice_number': invoice.doc_number,
-                'customer_name': invoice.customer_name,
-                'customer_display': invoice.customer.display_name if invoice.customer else invoice.customer_name,
-                'invoice_total': float(invoice.total_amt),
-                'calculated_total_credits': float(summary['calculated_total_credits']),
-                'available_credit_balance': float(summary['available_credit_balance']),
-                'is_fully_credited': summary['is_fully_credited'],
-                'credit_utilization_percentage': float(summary['credit_utilization_percentage']),
-                'linked_credit_notes_count': len(credit_notes_data),
-                'linked_credit_notes': credit_notes_data,
-            }
-            
-            return result
-            
-        except Invoice.DoesNotExist:
+            # Get the invoice with its credit total and credit note count
+            invoice = Invoice.objects.with_credit_summary().annotate(
+                calc_credit_notes_count=models.Count('credit_notes')
+            ).get(id=invoice_id)
+        except (Invoice.DoesNotExist, ValidationError):
             return {'error': f'Invoice not found with ID: {invoice_id}'}
-        except Exception as e:
-            return {'error': f'Failed to get credit summary: {str(e)}'}
\ No newline at end of file
+        
+        # Calculate credit summary
+        summary = CreditNoteValidationService._annotated_credit_summary(invoice)
+        
+        # Get all linked credit notes, streamed in chunks when there are many
+        credit_notes = CreditNote.objects.filter(related_invoice_id=invoice.id).only(
+            'id', 'doc_number', 'txn_date', 'total_amt', 'customer_name'
+        ).order_by('-txn_date')
+        if invoice.calc_credit_notes_count > _CREDIT_NOTES_CHUNK_SIZE:
+            credit_notes = credit_notes.iterator(chunk_size=_CREDIT_NOTES_CHUNK_SIZE)
+        
+        credit_notes_data = [
+            {
+                'id': str(cn.id),
+                'doc_number': cn.doc_number,
+                'txn_date': cn.txn_date.isoformat(),
+                'amount': float(cn.total_amt),
+                'customer_name': cn.customer_name,
+            }
+            for cn in credit_notes
+        ]
+        
+        # Build complete summary
+        result = {
+            'invoice_id': str(invoice.id),
+            'invoice_number': invoice.doc_number,
+            'customer_name': invoice.customer_name,
+            'customer_display': invoice.customer.display_name if invoice.customer else invoice.customer_name,
+            'invoice_total': float(invoice.total_amt),
+            'calculated_total_credits': float(summary['calculated_total_credits']),
+            'available_credit_balance': float(summary['available_credit_balance']),
+            'is_fully_credited': summary['is_fully_credited'],
+            'credit_utilization_percentage': float(summary['credit_utilization_percentage']),
+            'linked_credit_notes_count': invoice.calc_credit_notes_count,
+            'linked_credit_notes': credit_notes_data,
+        }
+        
+        return result
@@ -3,12 +3,15 @@ Invoice Filtering Service
 Filters and annotates invoices for credit note linking.
 """
 
-from django.db.models import Q, F, Value, DecimalField, Case, When, Subquery, OuterRef
-from django.db.models.functions import Coalesce
+from django.db.models import Q, F, Exists, OuterRef, Window
 from django.db import models
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
+import base64
+import datetime
+import json
+import uuid
 
-from invoices.models import Invoice
+from invoices.models import Invoice, CUSTOMER_DISPLAY
 from creditnote.models import CreditNote
 from creditnote.custom_services.credit_validation_service import CreditNoteValidationService
 
@@ -18,6 +21,31 @@ class InvoiceFilterService:
     Service for filtering and annotating invoices for credit note linking.
     """
     
+    @staticmethod
+    def _encode_cursor(row):
+        """
+        Opaque keyset cursor for the position after an available-invoices row.
+        """
+        position = [str(row['available_balance']), row['txn_date'].isoformat(), str(row['id'])]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+    
+    @staticmethod
+    def _decode_cursor(cursor):
+        """
+        Decode a cursor from _encode_cursor into (available_balance, txn_date, id).
+        
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        try:
+            balance, txn_date, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            balance = Decimal(balance)
+            if not balance.is_finite():
+                raise ValueError(balance)
+            return balance, datetime.date.fromisoformat(txn_date), uuid.UUID(pk)
+        except (ValueError, TypeError, AttributeError, InvalidOperation):
+            raise ValueError("Invalid cursor")
+    
     @staticmethod
     def get_invoices_available_for_credit(
         company,
@@ -26,7 +54,9 @@ class InvoiceFilterService:
         min_available_balance: Decimal = None,
         exclude_fully_credited: bool = True,
         page: int = 1,  # Add page parameter
-        page_size: int = 20  # Add page_size parameter
+        page_size: int = 20,  # Add page_size parameter
+        customer_fields=('display_name', 'company_name'),
+        cursor: str = None
     ):
         """
         Get invoices that are available for credit note linking WITH PAGINATION SUPPORT.
@@ -39,9 +69,18 @@ class InvoiceFilterService:
             exclude_fully_credited: Whether to exclude fully credited invoices
             page: Page number (1-indexed)
             page_size: Number of items per page
+            customer_fields: Customer columns to include in each row's 'customer' dict
+            cursor: next_cursor from a previous call; seeks past that row
+                instead of using page, and skips the total count
             
         Returns:
-            dict: Paginated results with annotations preserved
+            dict: Paginated results; each result is a dict of invoice columns,
+            total_credits_applied, available_balance, customer_display and
+            'customer' (None if unlinked).
+            total_count, page and total_pages are None in cursor mode.
+        
+        Raises:
+            ValueError: If cursor is malformed
         """
         # Start with base queryset
         queryset = Invoice.objects.filter(company=company)
@@ -62,30 +101,8 @@ class InvoiceFilterService:
                 Q(customer__company_name__icontains=customer_name)
             )
         
-        # Annotate with credit information using subquery for better performance
-        # Calculate total credits applied to each invoice
-        credit_sum_subquery = CreditNote.objects.filter(
-            related_invoice=OuterRef('pk')
-        ).values('related_invoice').annotate(
-            total_credits=models.Sum('total_amt')
-        ).values('total_credits')
-        
-        queryset = queryset.annotate(
-            total_credits_applied=Coalesce(
-                Subquery(credit_sum_subquery),
-                Value(Decimal('0.00'), output_field=DecimalField(max_digits=15, decimal_places=2))
-            ),
-            available_balance=Case(
-                When(
-                    total_amt__isnull=False,
-                    then=F('total_amt') - Coalesce(
-                        Subquery(credit_sum_subquery),
-                        Value(Decimal('0.00'), output_field=DecimalField(max_digits=15, decimal_places=2))
-                    )
-                ),
-                default=Value(Decimal('0.00'), output_field=DecimalField(max_digits=15, decimal_places=2))
-            )
-        )
+        # available_balance is the stored Invoice column, so filtering and
+        # ordering run on the (company, available_balance) index with no aggregate
         
         # Apply available balance filter
         if min_available_balance is not None:
@@ -95,31 +112,75 @@ class InvoiceFilterService:
         if exclude_fully_credited:
             queryset = queryset.filter(available_balance__gt=Decimal('0.01'))
         
-        # Order by available balance (descending) and date
-        queryset = queryset.order_by('-available_balance', '-txn_date')
+        # Order by available balance (descending) and date; id breaks ties so
+        # every row has a unique position for the cursor
+        queryset = queryset.order_by('-available_balance', '-txn_date', '-id')
         
-        # Manually handle pagination to preserve annotations
-        total_count = queryset.count()
+        if cursor:
+            # Seek past the cursor row: constant cost per page at any depth
+            after_balance, after_date, after_id = InvoiceFilterService._decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(available_balance__lt=after_balance) |
+                Q(available_balance=after_balance, txn_date__lt=after_date) |
+                Q(available_balance=after_balance, txn_date=after_date, id__lt=after_id)
+            )
+            # One extra row tells whether another page follows
+            page_rows = list(queryset.values_list('pk', flat=True)[:page_size + 1])
+            has_next = len(page_rows) > page_size
+            page_rows = page_rows[:page_size]
+            total_count = None
+        else:
+            # Manually handle pagination to preserve annotations
+            # Calculate pagination
+            start_index = (page - 1) * page_size
+            end_index = page * page_size
+            
+            # Resolve the page to bare primary keys first, so the OFFSET scan only
+            # carries ids, then load the invoice rows for that page alone.
+            # COUNT(*) OVER () returns the filtered total with the page itself.
+            page_rows = list(
+                queryset.annotate(
+                    total_count=Window(expression=models.Count('*'))
+                ).values_list('pk', 'total_count')[start_index:end_index]
+            )
+            if page_rows:
+                total_count = page_rows[0][1]
+            else:
+                # Past the last page (or no matches): no row to read the total from
+                total_count = queryset.count()
+            has_next = end_index < total_count
         
-        # Calculate pagination
-        start_index = (page - 1) * page_size
-        end_index = page * page_size
+        if not cursor:
+            page_rows = [pk for pk, _ in page_rows]
+        positions = {pk: position for position, pk in enumerate(page_rows)}
         
-        # Get the paginated subset
-        invoices = list(queryset[start_index:end_index])
+        # Plain dicts for the page rows; the customer columns come from the same JOIN
+        customer_values = [f'customer__{field}' for field in customer_fields]
+        rows = Invoice.objects.filter(pk__in=page_rows).values(
+            'id', 'doc_number', 'qb_invoice_id', 'txn_date', 'total_amt', 'customer_name',
+            'customer_id', 'available_balance', *customer_values,
+            customer_display=CUSTOMER_DISPLAY
+        )
+        invoices = []
+        for row in sorted(rows, key=lambda row: positions[row['id']]):
+            customer = {field: row.pop(f'customer__{field}') for field in customer_fields}
+            row['customer'] = customer if row.pop('customer_id') is not None else None
+            row['total_credits_applied'] = row['total_amt'] - row['available_balance']
+            invoices.append(row)
         
-        # Calculate pagination metadata
-        has_next = end_index < total_count
-        has_previous = page > 1
+        next_cursor = None
+        if has_next and invoices:
+            next_cursor = InvoiceFilterService._encode_cursor(invoices[-1])
         
         return {
             'results': invoices,
             'total_count': total_count,
-            'page': page,
+            'page': None if cursor else page,
             'page_size': page_size,
             'has_next': has_next,
-            'has_previous': has_previous,
-            'total_pages': (total_count + page_size - 1) // page_size
+            'has_previous': bool(cursor) or page > 1,
+            'total_pages': None if cursor else (total_count + page_size - 1) // page_size,
+            'next_cursor': next_cursor
         }
     
     @staticmethod
@@ -134,7 +195,7 @@ class InvoiceFilterService:
             dict: Invoice data with credit details
         """
         try:
-            invoice = Invoice.objects.get(id=invoice_id)
+            invoice = Invoice.objects.select_related('customer').get(id=invoice_id)
             
             # Use the validation service to calculate credit summary
             summary = CreditNoteValidationService.calculate_invoice_credit_summary(invoice)
@@ -168,28 +229,19 @@ class InvoiceFilterService:
         Returns:
             QuerySet: Fully credited invoices
         """
-        # Get all invoices with credit annotation
+        # Credits applied follow from the stored available_balance; named
+        # total_credits_applied because calculated_total_credits is an Invoice
+        # property and cannot be assigned an annotation
         invoices = Invoice.objects.filter(company=company).annotate(
-            calculated_total_credits=Coalesce(
-                models.Sum('credit_notes__total_amt'),
-                Value(Decimal('0.00'), output_field=DecimalField(max_digits=15, decimal_places=2))
-            ),
-            available_balance=Case(
-                When(
-                    total_amt__isnull=False,
-                    then=F('total_amt') - Coalesce(
-                        models.Sum('credit_notes__total_amt'),
-                        Value(Decimal('0.00'), output_field=DecimalField(max_digits=15, decimal_places=2))
-                    )
-                ),
-                default=Value(Decimal('0.00'), output_field=DecimalField(max_digits=15, decimal_places=2))
-            )
+            total_credits_applied=F('total_amt') - F('available_balance'),
+            # Read by Invoice.customer_display without loading the customer
+            calc_customer_display=CUSTOMER_DISPLAY
         )
         
-        # Filter for fully credited
+        # Filter for fully credited; the raw QB payload is never rendered here
         fully_credited = invoices.filter(
             available_balance__lte=Decimal('0.01')
-        ).order_by('-txn_date')
+        ).defer('raw_data').order_by('-txn_date')
         
         if limit:
             fully_credited = fully_credited[:limit]
@@ -207,27 +259,23 @@ class InvoiceFilterService:
         Returns:
             Dict: Summary statistics
         """
-        # Get all invoices for the company
-        invoices = Invoice.objects.filter(company=company)
-        total_invoices = invoices.count()
-        
-        # Get invoices with credits
-        invoices_with_credits = invoices.filter(credit_notes__isnull=False).distinct().count()
-        
-        # Get total invoice amount
-        total_invoice_amount = invoices.aggregate(
-            total=models.Sum('total_amt')
-        )['total'] or Decimal('0.00')
-        
-        # Get total credits applied
-        total_credits = CreditNote.objects.filter(
-            related_invoice__company=company
+        # All counts and totals in one pass over the company's invoices
+        summary = Invoice.objects.filter(company=company).annotate(
+            has_credits=Exists(CreditNote.objects.filter(related_invoice=OuterRef('pk')))
         ).aggregate(
-            total=models.Sum('total_amt')
-        )['total'] or Decimal('0.00')
-        
-        # Get fully credited invoices count
-        fully_credited_count = InvoiceFilterService.get_fully_credited_invoices(company).count()
+            total_invoices=models.Count('id'),
+            invoices_with_credits=models.Count('id', filter=Q(has_credits=True)),
+            total_invoice_amount=models.Sum('total_amt'),
+            total_credits=models.Sum(F('total_amt') - F('available_balance')),
+            fully_credited_count=models.Count(
+                'id', filter=Q(available_balance__lte=Decimal('0.01'))
+            ),
+        )
+        total_invoices = summary['total_invoices']
+        invoices_with_credits = summary['invoices_with_credits']
+        total_invoice_amount = summary['total_invoice_amount'] or Decimal('0.00')
+        total_credits = summary['total_credits'] or Decimal('0.00')
+        fully_credited_count = summary['fully_credited_count']
         
         return {
             'total_invoices': total_invoices,
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0006_remove_companymembership_companies_c_user_id_ae9f2c_idx_and_more'),
+        ('creditnote', '0005_creditnote_customer'),
+        ('customers', '0001_initial'),
+        ('invoices', '0003_remove_invoice_balance_kes_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='creditnote',
+            name='creditnote__related_ee68d3_idx',
+        ),
+        migrations.AddIndex(
+            model_name='creditnote',
+            index=models.Index(fields=['related_invoice', 'total_amt'], name='cn_invoice_amt_idx'),
+        ),
+    ]
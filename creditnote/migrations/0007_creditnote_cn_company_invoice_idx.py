@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0006_remove_companymembership_companies_c_user_id_ae9f2c_idx_and_more'),
+        ('creditnote', '0006_creditnote_cn_invoice_amt_idx'),
+        ('customers', '0001_initial'),
+        ('invoices', '0003_remove_invoice_balance_kes_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='creditnote',
+            index=models.Index(fields=['company', 'related_invoice'], name='cn_company_invoice_idx'),
+        ),
+    ]
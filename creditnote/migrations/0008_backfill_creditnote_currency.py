@@ -0,0 +1,56 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+from django.db.models import Q
+
+
+def backfill_currency(apps, schema_editor):
+    """
+    Copy CurrencyRef/ExchangeRate from raw_data into the currency columns for
+    credit notes synced before those columns existed.
+    """
+    CreditNote = apps.get_model('creditnote', 'CreditNote')
+    candidates = CreditNote.objects.filter(
+        Q(currency_ref_value__isnull=True) | Q(currency_ref_value='') | Q(exchange_rate=Decimal('1.0')),
+        raw_data__isnull=False
+    ).only('id', 'currency_ref_value', 'exchange_rate', 'raw_data')
+
+    batch = []
+    for credit_note in candidates.iterator(chunk_size=2000):
+        raw_data = credit_note.raw_data
+        if not isinstance(raw_data, dict):
+            continue
+
+        changed = False
+        if not credit_note.currency_ref_value:
+            currency_ref = raw_data.get('CurrencyRef', {})
+            if isinstance(currency_ref, dict) and currency_ref.get('value'):
+                credit_note.currency_ref_value = currency_ref['value']
+                changed = True
+
+        if credit_note.exchange_rate == Decimal('1.0') and raw_data.get('ExchangeRate') is not None:
+            try:
+                credit_note.exchange_rate = Decimal(str(raw_data['ExchangeRate']))
+                changed = True
+            except InvalidOperation:
+                pass
+
+        if changed:
+            batch.append(credit_note)
+        if len(batch) >= 1000:
+            CreditNote.objects.bulk_update(batch, ['currency_ref_value', 'exchange_rate'])
+            batch = []
+
+    if batch:
+        CreditNote.objects.bulk_update(batch, ['currency_ref_value', 'exchange_rate'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('creditnote', '0007_creditnote_cn_company_invoice_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_currency, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0006_remove_companymembership_companies_c_user_id_ae9f2c_idx_and_more'),
+        ('creditnote', '0008_backfill_creditnote_currency'),
+        ('customers', '0001_initial'),
+        ('invoices', '0004_invoice_available_balance'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='creditnote',
+            index=models.Index(fields=['company', 'balance'], name='cn_company_balance_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creditnote',
+            index=models.Index(condition=models.Q(('balance__gt', 0)), fields=['company', '-txn_date'], name='cn_pending_by_date'),
+        ),
+    ]
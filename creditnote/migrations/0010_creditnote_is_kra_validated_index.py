@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:05
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def backfill_kra_validated(apps, schema_editor):
+    """
+    Derive is_kra_validated from the existing KRA submissions, now that the
+    column rather than the submissions is what gets read.
+    """
+    CreditNote = apps.get_model('creditnote', 'CreditNote')
+    KRAInvoiceSubmission = apps.get_model('kra', 'KRAInvoiceSubmission')
+    CreditNote.objects.update(
+        is_kra_validated=Exists(
+            KRAInvoiceSubmission.objects.filter(
+                credit_note=OuterRef('pk'), status__in=['success', 'signed']
+            )
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('creditnote', '0009_creditnote_status_indexes'),
+        ('kra', '0002_kra_credit_note_latest_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='creditnote',
+            name='is_kra_validated',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(backfill_kra_validated, migrations.RunPython.noop),
+    ]
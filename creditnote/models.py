@@ -3,12 +3,118 @@ from django.conf import settings
 from common.models import TimeStampModel
 from companies.models import Company
 from invoices.models import Invoice
-from django.db.models import Sum
+from django.db.models import Sum, F, Q, Case, When, Value
+from django.db.models.fields.json import KeyTextTransform, KeyTransform
 from decimal import Decimal
+from functools import cached_property
 import json
 
 User = settings.AUTH_USER_MODEL
 
+KES_AMOUNT_FIELD = models.DecimalField(max_digits=20, decimal_places=6)
+
+# Rows per INSERT ... ON CONFLICT statement; raw_data JSON makes rows large,
+# so this keeps each statement well under the driver's query size limit
+UPSERT_BATCH_SIZE = 500
+
+
+def _upsert_update_fields(records, unique_fields):
+    """
+    Columns an upsert overwrites: those present in any record plus updated_at.
+    Columns the records leave out keep their stored values on conflict.
+    """
+    fields = {name for record in records for name in record} - set(unique_fields)
+    return sorted(fields | {'updated_at'})
+
+
+# Names for common currency codes, for credit notes synced without CurrencyRef.name
+CURRENCY_NAMES = {
+    'KES': 'Kenyan Shilling',
+    'USD': 'United States Dollar',
+    'EUR': 'Euro',
+    'GBP': 'British Pound',
+    # Add more as needed
+}
+
+
+# Credit note status by the sign of its balance: index 0, 1 and -1
+STATUS_BY_SIGN = ('applied', 'pending', 'void')
+
+
+def _status_for(balance):
+    return STATUS_BY_SIGN[(balance > 0) - (balance < 0)]
+
+
+def _kes_amount(amount, currency='currency_ref_value', exchange_rate='exchange_rate'):
+    """
+    SQL counterpart of the *_kes properties: the amount converted at the
+    exchange rate when the currency is set and not KES, else the amount itself.
+    """
+    is_foreign = Q(**{f'{currency}__isnull': False}) & ~Q(**{f'{currency}__in': ['', 'KES']})
+    return Case(
+        When(is_foreign, then=F(amount) * F(exchange_rate)),
+        default=F(amount),
+        output_field=KES_AMOUNT_FIELD
+    )
+
+
+def _status_case(balance):
+    """SQL counterpart of _status_for over the given balance column"""
+    return Case(
+        When(**{balance: 0}, then=Value(STATUS_BY_SIGN[0])),
+        When(**{f'{balance}__gt': 0}, then=Value(STATUS_BY_SIGN[1])),
+        default=Value(STATUS_BY_SIGN[-1]),
+        output_field=models.CharField()
+    )
+
+
+class CreditNoteManager(models.Manager):
+    def with_kes_amounts(self):
+        """
+        Credit notes annotated with calc_total_amt_kes, calc_balance_kes,
+        calc_subtotal_kes and calc_tax_total_kes, so KES totals can be
+        filtered and aggregated in the database.
+        """
+        return self.get_queryset().annotate(
+            calc_total_amt_kes=_kes_amount('total_amt'),
+            calc_balance_kes=_kes_amount('balance'),
+            calc_subtotal_kes=_kes_amount('subtotal'),
+            calc_tax_total_kes=_kes_amount('tax_total'),
+        )
+
+    def with_status(self):
+        """
+        Credit notes annotated with calc_status (the CreditNote.status rule),
+        calc_applied_amount (total_amt - balance), calc_balance_kes and
+        calc_status_kes (the status_kes rule), which the status,
+        applied_amount, balance_kes and status_kes properties return when present.
+        """
+        return self.get_queryset().annotate(
+            calc_status=_status_case('balance'),
+            calc_applied_amount=F('total_amt') - F('balance'),
+            calc_balance_kes=_kes_amount('balance'),
+        ).annotate(
+            calc_status_kes=_status_case('calc_balance_kes'),
+        )
+
+
+class CreditNoteLineManager(models.Manager):
+    def with_kes_amounts(self):
+        """
+        Credit note lines annotated with calc_amount_kes, calc_tax_amount_kes
+        and calc_unit_price_kes, converted at the parent credit note's rate.
+        """
+        currency = {
+            'currency': 'credit_note__currency_ref_value',
+            'exchange_rate': 'credit_note__exchange_rate',
+        }
+        return self.get_queryset().annotate(
+            calc_amount_kes=_kes_amount('amount', **currency),
+            calc_tax_amount_kes=_kes_amount('tax_amount', **currency),
+            calc_unit_price_kes=_kes_amount('unit_price', **currency),
+        )
+
+
 class CreditNote(TimeStampModel):
     """QuickBooks Credit Note (Credit Memo) model"""
     
@@ -36,8 +142,9 @@ class CreditNote(TimeStampModel):
     subtotal = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     tax_total = models.DecimalField(max_digits=15, decimal_places=2, default=0)
 
-    # KRA validation - same as invoices
-    is_kra_validated = models.BooleanField(default=False)
+    # KRA validation - same as invoices; kept in step with the submissions by
+    # kra.signals, so serializers and filters read the column
+    is_kra_validated = models.BooleanField(default=False, db_index=True)
     
     # Enhanced tax information
     tax_rate_ref = models.CharField(max_length=50, blank=True, null=True)
@@ -86,55 +193,76 @@ class CreditNote(TimeStampModel):
     # Raw QB data
     raw_data = models.JSONField(blank=True, null=True)
     
+    objects = CreditNoteManager()
+    
     class Meta:
         unique_together = ('company', 'qb_credit_id')
         indexes = [
             models.Index(fields=['company', 'txn_date']),
             models.Index(fields=['qb_credit_id']),
             models.Index(fields=['customer_name']),
-            models.Index(fields=['related_invoice']),
+            # Covers SUM(total_amt) per invoice; also serves related_invoice lookups
+            models.Index(fields=['related_invoice', 'total_amt'], name='cn_invoice_amt_idx'),
+            # Company-scoped linked/unlinked credit note counts
+            models.Index(fields=['company', 'related_invoice'], name='cn_company_invoice_idx'),
+            # Status filters and counts (applied/pending/void are balance predicates)
+            models.Index(fields=['company', 'balance'], name='cn_company_balance_idx'),
+            # Pending credit notes listed newest first
+            models.Index(
+                fields=['company', '-txn_date'], condition=Q(balance__gt=0), name='cn_pending_by_date'
+            ),
             models.Index(fields=['currency_ref_value']),  # NEW: Index for currency
         ]
 
-    @property
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted link so the signals can refresh the old invoice too
+        instance._loaded_related_invoice_id = instance.__dict__.get('related_invoice_id')
+        return instance
+
+    # Memoized per instance; cleared on save() and refresh_from_db()
+    CURRENCY_CACHED_PROPERTIES = ('effective_currency', 'effective_exchange_rate', 'is_foreign_currency')
+
+    def save(self, *args, **kwargs):
+        self._clear_currency_cache()
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, *args, **kwargs):
+        self._clear_currency_cache()
+        super().refresh_from_db(*args, **kwargs)
+
+    def _clear_currency_cache(self):
+        for name in self.CURRENCY_CACHED_PROPERTIES:
+            self.__dict__.pop(name, None)
+
+    @cached_property
     def effective_currency(self):
-        """Get the currency code, extracting from raw_data if not set"""
-        if self.currency_ref_value:
-            return self.currency_ref_value
-        
-        # Try to extract from raw_data
-        if self.raw_data and isinstance(self.raw_data, dict):
-            currency_ref = self.raw_data.get('CurrencyRef', {})
-            if isinstance(currency_ref, dict):
-                return currency_ref.get('value', 'KES')
-        
-        return 'KES'  # Default to KES
+        """Get the currency code (backfilled from raw_data by migration 0008)"""
+        return self.currency_ref_value or 'KES'  # Default to KES
     
-    @property
+    @cached_property
     def effective_exchange_rate(self):
-        """Get the exchange rate, extracting from raw_data if not set"""
-        if self.exchange_rate != Decimal('1.0'):
-            return self.exchange_rate
-        
-        # Try to extract from raw_data
-        if self.raw_data and isinstance(self.raw_data, dict):
-            exchange_rate = self.raw_data.get('ExchangeRate')
-            if exchange_rate is not None:
-                try:
-                    return Decimal(str(exchange_rate))
-                except:
-                    pass
-        
-        return Decimal('1.0')  # Default to 1.00
+        """Get the exchange rate (backfilled from raw_data by migration 0008)"""
+        return self.exchange_rate
     
-    @property
+    @cached_property
     def is_foreign_currency(self):
         """Check if credit note is in foreign currency (not KES)"""
         return self.effective_currency != 'KES'
     
+    @property
+    def effective_currency_name(self):
+        """Get the currency name (United States Dollar, Kenyan Shilling, etc.)"""
+        if self.currency_name:
+            return self.currency_name  # From database field
+        return CURRENCY_NAMES.get(self.effective_currency, self.effective_currency)
+    
     @property
     def total_amt_kes(self):
         """Calculate total amount in KES on-the-fly"""
+        if 'calc_total_amt_kes' in self.__dict__:
+            return self.calc_total_amt_kes
         if self.is_foreign_currency:
             return self.total_amt * self.effective_exchange_rate
         return self.total_amt
@@ -142,6 +270,8 @@ class CreditNote(TimeStampModel):
     @property
     def balance_kes(self):
         """Calculate balance in KES on-the-fly"""
+        if 'calc_balance_kes' in self.__dict__:
+            return self.calc_balance_kes
         if self.is_foreign_currency:
             return self.balance * self.effective_exchange_rate
         return self.balance
@@ -149,6 +279,8 @@ class CreditNote(TimeStampModel):
     @property
     def subtotal_kes(self):
         """Calculate subtotal in KES on-the-fly"""
+        if 'calc_subtotal_kes' in self.__dict__:
+            return self.calc_subtotal_kes
         if self.is_foreign_currency:
             return self.subtotal * self.effective_exchange_rate
         return self.subtotal
@@ -156,6 +288,8 @@ class CreditNote(TimeStampModel):
     @property
     def tax_total_kes(self):
         """Calculate tax total in KES on-the-fly"""
+        if 'calc_tax_total_kes' in self.__dict__:
+            return self.calc_tax_total_kes
         if self.is_foreign_currency:
             return self.tax_total * self.effective_exchange_rate
         return self.tax_total
@@ -175,8 +309,11 @@ class CreditNote(TimeStampModel):
     @property
     def currency_conversion_warning(self):
         """Get warning message if currencies don't match"""
-        if not self.original_invoice_currency_match and self.related_invoice:
-            invoice_currency = self.related_invoice.effective_currency if hasattr(self.related_invoice, 'effective_currency') else 'KES'
+        if not self.related_invoice:
+            return None
+        # Resolved once: Invoice.effective_currency may parse raw_data
+        invoice_currency = self.related_invoice.effective_currency
+        if invoice_currency != self.effective_currency:
             return f"Warning: Credit note in {self.effective_currency}, invoice in {invoice_currency}"
         return None
     
@@ -187,20 +324,23 @@ class CreditNote(TimeStampModel):
     @property
     def status(self):
         """Calculate status based on balance - same logic as needed for frontend"""
-        if self.balance == 0:
-            return 'applied'
-        elif self.balance > 0:
-            return 'pending'
-        return 'void'
+        if 'calc_status' in self.__dict__:
+            return self.calc_status
+        return _status_for(self.balance)
+    
+    @property
+    def applied_amount(self):
+        """Amount of the credit note already applied, in original currency"""
+        if 'calc_applied_amount' in self.__dict__:
+            return self.calc_applied_amount
+        return self.total_amt - self.balance
     
     @property
     def status_kes(self):
         """Calculate status based on KES balance"""
-        if self.balance_kes == 0:
-            return 'applied'
-        elif self.balance_kes > 0:
-            return 'pending'
-        return 'void'
+        if 'calc_status_kes' in self.__dict__:
+            return self.calc_status_kes
+        return _status_for(self.balance_kes)
     
     # Helper method for bulk operations
     @classmethod
@@ -208,16 +348,38 @@ class CreditNote(TimeStampModel):
         """
         Calculate KES amounts for a list of credit notes efficiently.
         Useful for reports or bulk operations.
+        Reads one values() row per credit note; the KES conversion runs in SQL.
         """
+        credit_notes = list(credit_notes)
+        rows = cls.objects.with_kes_amounts().filter(
+            pk__in=[credit_note.pk for credit_note in credit_notes]
+        ).values(
+            'pk', 'calc_total_amt_kes', 'calc_balance_kes', 'currency_ref_value', 'exchange_rate',
+            'related_invoice_id', 'related_invoice__currency_ref_value',
+            # Invoice.effective_currency falls back to raw_data
+            invoice_raw_currency=KeyTextTransform('value', KeyTransform('CurrencyRef', 'related_invoice__raw_data')),
+        )
+        rows_by_pk = {row['pk']: row for row in rows}
+        
         results = []
         for credit_note in credit_notes:
+            row = rows_by_pk[credit_note.pk]
+            currency = row['currency_ref_value'] or 'KES'
+            
+            currency_match = True  # No invoice to match against
+            if row['related_invoice_id'] is not None:
+                invoice_currency = (
+                    row['related_invoice__currency_ref_value'] or row['invoice_raw_currency'] or 'KES'
+                )
+                currency_match = invoice_currency == currency
+            
             results.append({
                 'credit_note': credit_note,
-                'total_amt_kes': credit_note.total_amt_kes,
-                'balance_kes': credit_note.balance_kes,
-                'currency': credit_note.effective_currency,
-                'exchange_rate': float(credit_note.effective_exchange_rate),
-                'currency_match': credit_note.original_invoice_currency_match,
+                'total_amt_kes': row['calc_total_amt_kes'],
+                'balance_kes': row['calc_balance_kes'],
+                'currency': currency,
+                'exchange_rate': float(row['exchange_rate']),
+                'currency_match': currency_match,
             })
         return results
 
@@ -247,15 +409,20 @@ class CreditNoteLine(TimeStampModel):
     # Raw QB data
     raw_data = models.JSONField(blank=True, null=True)
     
+    objects = CreditNoteLineManager()
+    
     class Meta:
         unique_together = ('credit_note', 'line_num')
         ordering = ['line_num']
     
-    # LAZY CALCULATION PROPERTIES FOR KES AMOUNTS (SAME AS INVOICE LINE)
+    # LAZY CALCULATION PROPERTIES FOR KES AMOUNTS (SAME AS INVOICE LINE);
+    # each returns its with_kes_amounts() annotation when present
     
     @property
     def amount_kes(self):
         """Calculate line amount in KES on-the-fly"""
+        if 'calc_amount_kes' in self.__dict__:
+            return self.calc_amount_kes
         if self.credit_note.is_foreign_currency:
             return self.amount * self.credit_note.effective_exchange_rate
         return self.amount
@@ -263,6 +430,8 @@ class CreditNoteLine(TimeStampModel):
     @property
     def tax_amount_kes(self):
         """Calculate tax amount in KES on-the-fly"""
+        if 'calc_tax_amount_kes' in self.__dict__:
+            return self.calc_tax_amount_kes
         if self.credit_note.is_foreign_currency:
             return self.tax_amount * self.credit_note.effective_exchange_rate
         return self.tax_amount
@@ -270,10 +439,34 @@ class CreditNoteLine(TimeStampModel):
     @property
     def unit_price_kes(self):
         """Calculate unit price in KES on-the-fly"""
+        if 'calc_unit_price_kes' in self.__dict__:
+            return self.calc_unit_price_kes
         if self.credit_note.is_foreign_currency:
             return self.unit_price * self.credit_note.effective_exchange_rate
         return self.unit_price
     
+    @classmethod
+    def bulk_upsert(cls, records):
+        """
+        Insert or update credit note lines in batched INSERT ... ON CONFLICT
+        statements keyed on (credit_note, line_num).
+        
+        Args:
+            records: Dicts of CreditNoteLine field values, each with
+                credit_note and line_num
+        """
+        records = list(records)
+        if not records:
+            return
+        unique_fields = ['credit_note', 'line_num']
+        cls.objects.bulk_create(
+            [cls(**record) for record in records],
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=_upsert_update_fields(records, unique_fields),
+            batch_size=UPSERT_BATCH_SIZE
+        )
+    
     def __str__(self):
         currency = self.credit_note.effective_currency if hasattr(self.credit_note, 'effective_currency') else 'KES'
         return f"{self.item_name} - {self.amount} ({currency})"
\ No newline at end of file
@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from django.db.models import Subquery, OuterRef, Exists, Value, Prefetch
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 from .models import CreditNote, CreditNoteLine
 from invoices.models import Invoice
@@ -6,20 +8,37 @@ from companies.models import Company
 from kra.models import KRAInvoiceSubmission
 from invoices.serializers import KRASubmissionSerializer
 from customers.models import Customer
+from customers.serializers import CustomerSerializer
 
-class SimpleCustomerSerializer(serializers.ModelSerializer):
-    """Simplified customer serializer for invoice dropdown"""
-    
-    class Meta:
-        model = Customer
-        fields = ['id', 'display_name', 'company_name', 'kra_pin']
 
-from customers.serializers import CustomerSerializer
+def latest_kra_submission(credit_note):
+    """
+    Most recent KRA submission of a credit note, or None.
+    Reads kra_submissions.all(), so a prefetched list costs no query.
+    """
+    return max(
+        credit_note.kra_submissions.all(),
+        key=lambda submission: submission.created_at,
+        default=None
+    )
+
+class ResponseCachedCustomerSerializer(CustomerSerializer):
+    """
+    CustomerSerializer that renders each customer once per response: lists of
+    invoices or credit notes repeat a handful of customers, and the nested
+    serializers all share the root serializer's context.
+    """
+
+    def to_representation(self, instance):
+        representations = self.context.setdefault('_customer_representations', {})
+        if instance.pk not in representations:
+            representations[instance.pk] = super().to_representation(instance)
+        return representations[instance.pk]
 
 class InvoiceDropdownSerializer(serializers.ModelSerializer):
     """Serializer for invoice dropdown with customer info"""
-    customer = CustomerSerializer(read_only=True)  # Changed from SimpleCustomerSerializer
-    customer_display = serializers.SerializerMethodField()
+    customer = ResponseCachedCustomerSerializer(read_only=True)  # Changed from SimpleCustomerSerializer
+    customer_display = serializers.ReadOnlyField()
     
     class Meta:
         model = Invoice
@@ -28,16 +47,10 @@ class InvoiceDropdownSerializer(serializers.ModelSerializer):
             'total_amt', 'customer', 'customer_display'
         ]
     
-    def get_customer_display(self, obj):
-        """Get display name for customer"""
-        if obj.customer:
-            return obj.customer.display_name or obj.customer.company_name
-        return obj.customer_name or "Unknown Customer"
-
 class RelatedInvoiceSerializer(serializers.ModelSerializer):
     """Enhanced serializer for related invoice information with customer details"""
-    customer = CustomerSerializer(read_only=True)  # Changed from SimpleCustomerSerializer
-    customer_display = serializers.SerializerMethodField()
+    customer = ResponseCachedCustomerSerializer(read_only=True)  # Changed from SimpleCustomerSerializer
+    customer_display = serializers.ReadOnlyField()
     
     class Meta:
         model = Invoice
@@ -48,62 +61,33 @@ class RelatedInvoiceSerializer(serializers.ModelSerializer):
             "due_date"
         ]
     
-    def get_customer_display(self, obj):
-        """Get display name for customer"""
-        if obj.customer:
-            return obj.customer.display_name or obj.customer.company_name
-        return obj.customer_name or "Unknown Customer"
-
-class CreditNoteLineSerializer(serializers.ModelSerializer):
-    """Serializer for credit note line items with tax information and KES equivalents"""
-    
-    amount_kes = serializers.SerializerMethodField()
-    tax_amount_kes = serializers.SerializerMethodField()
-    unit_price_kes = serializers.SerializerMethodField()
-    
-    class Meta:
-        model = CreditNoteLine
-        fields = [
-            "id", "credit_note", "line_num", "item_ref_value", "item_name", "description",
-            "qty", "unit_price", "amount", "amount_kes", "unit_price_kes",
-            "tax_code_ref", "tax_rate_ref", "tax_percent", "tax_amount", "tax_amount_kes",
-            "raw_data", "created_at", "updated_at"
-        ]
-        read_only_fields = ["id", "created_at", "updated_at"]
-    
-    def get_amount_kes(self, obj):
-        """Get line amount in KES"""
-        if hasattr(obj, 'amount_kes'):
-            return float(obj.amount_kes)
-        else:
-            # Fallback calculation
-            credit_note = obj.credit_note
-            if hasattr(credit_note, 'is_foreign_currency') and credit_note.is_foreign_currency:
-                return float(obj.amount * credit_note.effective_exchange_rate)
-            return float(obj.amount)
-    
-    def get_tax_amount_kes(self, obj):
-        """Get tax amount in KES"""
-        if hasattr(obj, 'tax_amount_kes'):
-            return float(obj.tax_amount_kes)
-        else:
-            # Fallback calculation
-            credit_note = obj.credit_note
-            if hasattr(credit_note, 'is_foreign_currency') and credit_note.is_foreign_currency:
-                tax_amount = obj.tax_amount or Decimal('0.00')
-                return float(tax_amount * credit_note.effective_exchange_rate)
-            return float(obj.tax_amount or 0)
-    
-    def get_unit_price_kes(self, obj):
-        """Get unit price in KES"""
-        if hasattr(obj, 'unit_price_kes'):
-            return float(obj.unit_price_kes)
-        else:
-            # Fallback calculation
-            credit_note = obj.credit_note
-            if hasattr(credit_note, 'is_foreign_currency') and credit_note.is_foreign_currency:
-                return float(obj.unit_price * credit_note.effective_exchange_rate)
-            return float(obj.unit_price)
+class CreditNoteLineSerializer(serializers.Serializer):
+    """
+    Serializer for credit note line items with tax information and KES equivalents.
+    Line items are only ever rendered, so the fields are declared read-only by
+    hand rather than built from the model on every serializer instance.
+    """
+    
+    id = serializers.UUIDField(read_only=True)
+    credit_note = serializers.PrimaryKeyRelatedField(read_only=True)
+    line_num = serializers.IntegerField(read_only=True)
+    item_ref_value = serializers.CharField(read_only=True)
+    item_name = serializers.CharField(read_only=True)
+    description = serializers.CharField(read_only=True)
+    qty = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    unit_price = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
+    amount = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
+    # KES equivalents are CreditNoteLine properties
+    amount_kes = serializers.FloatField(read_only=True)
+    unit_price_kes = serializers.FloatField(read_only=True)
+    tax_code_ref = serializers.CharField(read_only=True)
+    tax_rate_ref = serializers.CharField(read_only=True)
+    tax_percent = serializers.DecimalField(max_digits=5, decimal_places=2, read_only=True)
+    tax_amount = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
+    tax_amount_kes = serializers.FloatField(read_only=True)
+    raw_data = serializers.JSONField(read_only=True)
+    created_at = serializers.DateTimeField(read_only=True)
+    updated_at = serializers.DateTimeField(read_only=True)
 
 class CompanyInfoSerializer(serializers.ModelSerializer):
     """Serializer for company information"""
@@ -126,23 +110,22 @@ class CreditNoteSerializer(serializers.ModelSerializer):
     kra_submissions = KRASubmissionSerializer(many=True, read_only=True)
     kra_submission = serializers.SerializerMethodField()
     
-    # CURRENCY FIELDS - credit note specific (not company)
-    currency_code = serializers.SerializerMethodField()
-    currency_name = serializers.SerializerMethodField()
-    exchange_rate = serializers.SerializerMethodField()
-    is_foreign_currency = serializers.SerializerMethodField()
+    # CURRENCY FIELDS - credit note specific (not company), from the model properties
+    currency_code = serializers.ReadOnlyField(source='effective_currency')
+    currency_name = serializers.ReadOnlyField(source='effective_currency_name')
+    exchange_rate = serializers.FloatField(source='effective_exchange_rate', read_only=True)
+    is_foreign_currency = serializers.ReadOnlyField()
     
     # KES EQUIVALENTS
-    total_amt_kes = serializers.SerializerMethodField()
-    balance_kes = serializers.SerializerMethodField()
-    subtotal_kes = serializers.SerializerMethodField()
-    tax_total_kes = serializers.SerializerMethodField()
-    
-    # Status and validation
-    status = serializers.SerializerMethodField()
-    status_kes = serializers.SerializerMethodField()
+    total_amt_kes = serializers.FloatField(read_only=True)
+    balance_kes = serializers.FloatField(read_only=True)
+    subtotal_kes = serializers.FloatField(read_only=True)
+    tax_total_kes = serializers.FloatField(read_only=True)
+    
+    # Status and validation (CreditNote.status reads the with_status() annotation)
+    status = serializers.CharField(read_only=True)
+    status_kes = serializers.CharField(read_only=True)
     company_name = serializers.CharField(source='company.name', read_only=True)
-    is_kra_validated = serializers.SerializerMethodField()
 
     class Meta:
         model = CreditNote
@@ -191,125 +174,33 @@ class CreditNoteSerializer(serializers.ModelSerializer):
             "updated_at", "is_kra_validated"
         ]
     
-    # CURRENCY METHODS
-    def get_currency_code(self, obj):
-        """Get the original currency code (USD, KES, EUR, etc.)"""
-        if hasattr(obj, 'effective_currency'):
-            return obj.effective_currency  # From lazy calculation property
-        elif hasattr(obj, 'currency_ref_value') and obj.currency_ref_value:
-            return obj.currency_ref_value  # From database field
-        else:
-            return 'KES'  # Default
-
-    def get_currency_name(self, obj):
-        """Get the currency name (United States Dollar, Kenyan Shilling, etc.)"""
-        if hasattr(obj, 'currency_name') and obj.currency_name:
-            return obj.currency_name  # From database field
-        elif hasattr(obj, 'effective_currency'):
-            # Map common currency codes to names
-            currency_map = {
-                'KES': 'Kenyan Shilling',
-                'USD': 'United States Dollar',
-                'EUR': 'Euro',
-                'GBP': 'British Pound',
-                # Add more as needed
-            }
-            return currency_map.get(obj.effective_currency, obj.effective_currency)
-        else:
-            return 'Kenyan Shilling'  # Default
-
-    def get_exchange_rate(self, obj):
-        """Get exchange rate used for this credit note"""
-        if hasattr(obj, 'effective_exchange_rate'):
-            return float(obj.effective_exchange_rate)
-        elif hasattr(obj, 'exchange_rate'):
-            return float(obj.exchange_rate)
-        else:
-            return 1.0  # Default for KES or missing rate
-
-    def get_is_foreign_currency(self, obj):
-        """Check if credit note is in foreign currency (not KES)"""
-        if hasattr(obj, 'is_foreign_currency'):
-            return obj.is_foreign_currency
-        else:
-            currency = self.get_currency_code(obj)
-            return currency != 'KES'
-
-    # KES EQUIVALENT METHODS
-    def get_total_amt_kes(self, obj):
-        """Get total amount in KES (calculated)"""
-        if hasattr(obj, 'total_amt_kes'):
-            return float(obj.total_amt_kes)
-        else:
-            # Calculate on the fly if lazy property not available
-            currency = self.get_currency_code(obj)
-            exchange_rate = self.get_exchange_rate(obj)
-            if currency != 'KES':
-                return float(obj.total_amt * Decimal(str(exchange_rate)))
-            return float(obj.total_amt)
-
-    def get_balance_kes(self, obj):
-        """Get balance in KES (calculated)"""
-        if hasattr(obj, 'balance_kes'):
-            return float(obj.balance_kes)
-        else:
-            # Calculate on the fly
-            currency = self.get_currency_code(obj)
-            exchange_rate = self.get_exchange_rate(obj)
-            if currency != 'KES':
-                return float(obj.balance * Decimal(str(exchange_rate)))
-            return float(obj.balance)
-
-    def get_subtotal_kes(self, obj):
-        """Get subtotal in KES (calculated)"""
-        if hasattr(obj, 'subtotal_kes'):
-            return float(obj.subtotal_kes)
-        else:
-            # Calculate on the fly
-            currency = self.get_currency_code(obj)
-            exchange_rate = self.get_exchange_rate(obj)
-            if currency != 'KES':
-                return float(obj.subtotal * Decimal(str(exchange_rate)))
-            return float(obj.subtotal)
-
-    def get_tax_total_kes(self, obj):
-        """Get tax total in KES (calculated)"""
-        if hasattr(obj, 'tax_total_kes'):
-            return float(obj.tax_total_kes)
-        else:
-            # Calculate on the fly
-            currency = self.get_currency_code(obj)
-            exchange_rate = self.get_exchange_rate(obj)
-            if currency != 'KES':
-                return float(obj.tax_total * Decimal(str(exchange_rate)))
-            return float(obj.tax_total)
-
-    def get_status(self, obj):
-        """Calculate status based on balance in original currency"""
-        if obj.balance == 0:
-            return 'applied'
-        elif obj.balance > 0:
-            return 'pending'
-        return 'void'
-
-    def get_status_kes(self, obj):
-        """Calculate status based on KES balance"""
-        balance_kes = self.get_balance_kes(obj)
-        if balance_kes == 0:
-            return 'applied'
-        elif balance_kes > 0:
-            return 'pending'
-        return 'void'
-
-    def get_is_kra_validated(self, obj):
-        """Check if credit note has been successfully validated with KRA"""
-        return obj.kra_submissions.filter(status__in=['success', 'signed']).exists()
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Join and prefetch every relation the nested serializers read, so a
+        list costs a fixed number of queries rather than a few per credit note.
+        KRA submissions come newest first, as kra_submissions renders them.
+        """
+        return queryset.select_related(
+            # The invoice's customer joins here too: a Prefetch on an already
+            # select_related invoice is skipped, leaving one query per customer
+            'company', 'related_invoice__customer'
+        ).prefetch_related(
+            # Line KES amounts computed by the database, not per line in Python
+            Prefetch('line_items', queryset=CreditNoteLine.objects.with_kes_amounts()),
+            Prefetch(
+                'kra_submissions',
+                queryset=KRAInvoiceSubmission.objects.order_by('-created_at')
+            )
+        )
 
     def get_kra_submission(self, obj):
         """Get the latest KRA submission for this credit note"""
-        latest_submission = obj.kra_submissions.order_by('-created_at').first()
+        latest_submission = latest_kra_submission(obj)
         if latest_submission:
-            return KRASubmissionSerializer(latest_submission).data
+            # Reuse the kra_submissions child, whose fields are already built,
+            # instead of constructing a new serializer for every credit note
+            return self.fields['kra_submissions'].child.to_representation(latest_submission)
         return None
     
 class CreditNoteUpdateSerializer(serializers.ModelSerializer):
@@ -342,7 +233,7 @@ class CreditNoteUpdateSerializer(serializers.ModelSerializer):
         is_valid, error, details = CreditNoteValidationService.validate_credit_amount(
             credit_note.total_amt,
             str(value.id),
-            str(credit_note.company.id)
+            str(credit_note.company_id)
         )
         
         if not is_valid:
@@ -382,85 +273,70 @@ class CreditNoteUpdateSerializer(serializers.ModelSerializer):
         
         return attrs
 
+class TaxBreakdownSerializer(serializers.Serializer):
+    """Tax breakdown of a credit note in original currency (used with source='*')"""
+    
+    subtotal = serializers.DecimalField(
+        max_digits=15, decimal_places=2, coerce_to_string=False, read_only=True
+    )
+    tax_total = serializers.DecimalField(
+        max_digits=15, decimal_places=2, coerce_to_string=False, read_only=True
+    )
+    total_amount = serializers.DecimalField(
+        max_digits=15, decimal_places=2, coerce_to_string=False, source='total_amt', read_only=True
+    )
+    tax_rate_percentage = serializers.DecimalField(
+        max_digits=5, decimal_places=2, coerce_to_string=False, source='tax_percent', read_only=True
+    )
+
 class CreditNoteDetailSerializer(CreditNoteSerializer):
-    """Extended serializer for detailed credit note view with additional computed fields"""
-    
-    total_line_items = serializers.SerializerMethodField()
-    tax_breakdown = serializers.SerializerMethodField()
-    tax_breakdown_kes = serializers.SerializerMethodField()
-    applied_amount = serializers.SerializerMethodField()
-    applied_amount_kes = serializers.SerializerMethodField()
-    remaining_amount = serializers.SerializerMethodField()
-    remaining_amount_kes = serializers.SerializerMethodField()
-    original_invoice_currency_match = serializers.SerializerMethodField()
-    currency_conversion_warning = serializers.SerializerMethodField()
+    """
+    Extended serializer for detailed credit note view with additional computed fields.
+    total_line_items, tax_breakdown_kes and applied_amount_kes are derived in
+    to_representation from values the base serializer has already rendered.
+    """
+    
+    tax_breakdown = TaxBreakdownSerializer(source='*', read_only=True)
+    # Decimals rather than strings; the JSON renderer emits them as numbers
+    applied_amount = serializers.DecimalField(
+        max_digits=15, decimal_places=2, coerce_to_string=False, read_only=True
+    )
+    remaining_amount = serializers.DecimalField(
+        max_digits=15, decimal_places=2, coerce_to_string=False, source='balance', read_only=True
+    )
+    remaining_amount_kes = serializers.FloatField(source='balance_kes', read_only=True)
+    original_invoice_currency_match = serializers.ReadOnlyField()
+    currency_conversion_warning = serializers.ReadOnlyField()
 
     class Meta(CreditNoteSerializer.Meta):
         fields = CreditNoteSerializer.Meta.fields + [
-            "total_line_items", "tax_breakdown", "tax_breakdown_kes",
-            "applied_amount", "applied_amount_kes", "remaining_amount", "remaining_amount_kes",
+            "tax_breakdown", "applied_amount", "remaining_amount", "remaining_amount_kes",
             "original_invoice_currency_match", "currency_conversion_warning"
         ]
 
-    def get_total_line_items(self, obj):
-        """Get total number of line items"""
-        return obj.line_items.count()
-
-    def get_tax_breakdown(self, obj):
-        """Get tax breakdown information in original currency"""
-        return {
-            "subtotal": float(obj.subtotal),
-            "tax_total": float(obj.tax_total),
-            "total_amount": float(obj.total_amt),
-            "tax_rate_percentage": float(obj.tax_percent)
-        }
-
-    def get_tax_breakdown_kes(self, obj):
-        """Get tax breakdown information in KES"""
-        return {
-            "subtotal_kes": self.get_subtotal_kes(obj),
-            "tax_total_kes": self.get_tax_total_kes(obj),
-            "total_amount_kes": self.get_total_amt_kes(obj),
-            "tax_rate_percentage": float(obj.tax_percent)
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['total_line_items'] = len(data['line_items'])
+        data['tax_breakdown_kes'] = {
+            "subtotal_kes": data['subtotal_kes'],
+            "tax_total_kes": data['tax_total_kes'],
+            "total_amount_kes": data['total_amt_kes'],
+            "tax_rate_percentage": float(instance.tax_percent)
         }
+        data['applied_amount_kes'] = data['total_amt_kes'] - data['balance_kes']
+        return data
 
-    def get_applied_amount(self, obj):
-        """Get the amount that has been applied in original currency"""
-        return float(obj.total_amt - obj.balance)
-
-    def get_applied_amount_kes(self, obj):
-        """Get the amount that has been applied in KES"""
-        return self.get_total_amt_kes(obj) - self.get_balance_kes(obj)
-
-    def get_remaining_amount(self, obj):
-        """Get the remaining balance in original currency"""
-        return float(obj.balance)
-
-    def get_remaining_amount_kes(self, obj):
-        """Get the remaining balance in KES"""
-        return self.get_balance_kes(obj)
-
-    def get_original_invoice_currency_match(self, obj):
-        """Check if credit note currency matches original invoice currency"""
-        if hasattr(obj, 'original_invoice_currency_match'):
-            return obj.original_invoice_currency_match
-        return True  # Default to True if property not available
-
-    def get_currency_conversion_warning(self, obj):
-        """Get warning message if currencies don't match"""
-        if hasattr(obj, 'currency_conversion_warning'):
-            return obj.currency_conversion_warning
-        return None
 
 class CreditNoteSummarySerializer(serializers.ModelSerializer):
     """Serializer for credit note summary/list views with currency support"""
     
-    status = serializers.SerializerMethodField()
-    currency_code = serializers.SerializerMethodField()  # CHANGED: from company.currency_code
-    has_kra_submission = serializers.SerializerMethodField()
-    kra_status = serializers.SerializerMethodField()
-    is_foreign_currency = serializers.SerializerMethodField()
-    total_amt_kes = serializers.SerializerMethodField()
+    status = serializers.CharField(read_only=True)
+    currency_code = serializers.ReadOnlyField(source='effective_currency')  # CHANGED: from company.currency_code
+    # Both answered in the list query by setup_eager_loading
+    has_kra_submission = serializers.BooleanField(source='calc_has_kra_submission', read_only=True)
+    kra_status = serializers.CharField(source='calc_kra_status', read_only=True)
+    is_foreign_currency = serializers.ReadOnlyField()
+    total_amt_kes = serializers.FloatField(read_only=True)
 
     class Meta:
         model = CreditNote
@@ -472,65 +348,33 @@ class CreditNoteSummarySerializer(serializers.ModelSerializer):
             "kra_status", "created_at"
         ]
 
-    def get_currency_code(self, obj):
-        """Get the credit note's currency code"""
-        if hasattr(obj, 'effective_currency'):
-            return obj.effective_currency
-        elif hasattr(obj, 'currency_ref_value') and obj.currency_ref_value:
-            return obj.currency_ref_value
-        else:
-            return 'KES'
-
-    def get_is_foreign_currency(self, obj):
-        """Check if credit note is in foreign currency"""
-        if hasattr(obj, 'is_foreign_currency'):
-            return obj.is_foreign_currency
-        else:
-            currency = self.get_currency_code(obj)
-            return currency != 'KES'
-
-    def get_total_amt_kes(self, obj):
-        """Get total amount in KES"""
-        if hasattr(obj, 'total_amt_kes'):
-            return float(obj.total_amt_kes)
-        else:
-            # Calculate on the fly
-            currency = self.get_currency_code(obj)
-            if hasattr(obj, 'effective_exchange_rate'):
-                exchange_rate = obj.effective_exchange_rate
-            elif hasattr(obj, 'exchange_rate'):
-                exchange_rate = obj.exchange_rate
-            else:
-                exchange_rate = Decimal('1.0')
-            
-            if currency != 'KES':
-                return float(obj.total_amt * exchange_rate)
-            return float(obj.total_amt)
-
-    def get_status(self, obj):
-        """Calculate status based on balance"""
-        if obj.balance == 0:
-            return 'applied'
-        elif obj.balance > 0:
-            return 'pending'
-        return 'void'
-
-    def get_has_kra_submission(self, obj):
-        """Check if credit note has any KRA submissions"""
-        return obj.kra_submissions.exists()
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Load only the columns the summary reads and annotate whether any KRA
+        submission exists and the newest one's status, so a list renders from
+        one query. The summary requires these annotations.
+        """
+        submissions = KRAInvoiceSubmission.objects.filter(credit_note=OuterRef('pk'))
+        return queryset.annotate(
+            calc_has_kra_submission=Exists(submissions),
+            calc_kra_status=Coalesce(
+                Subquery(submissions.order_by('-created_at').values('status')[:1]),
+                Value('not_submitted')
+            )
+        ).only(
+            'id', 'qb_credit_id', 'doc_number', 'txn_date', 'customer_name',
+            'total_amt', 'balance', 'subtotal', 'tax_total', 'tax_percent',
+            'is_kra_validated', 'created_at',
+            # effective_currency / effective_exchange_rate for the KES amounts
+            'currency_ref_value', 'exchange_rate'
+        )
 
-    def get_kra_status(self, obj):
-        """Get simplified KRA status"""
-        if not obj.kra_submissions.exists():
-            return 'not_submitted'
-        
-        latest_submission = obj.kra_submissions.order_by('-created_at').first()
-        return latest_submission.status if latest_submission else 'not_submitted'
 
 class InvoiceCreditSummarySerializer(serializers.ModelSerializer):
     """Serializer for invoice with credit summary information"""
     
-    customer_display = serializers.SerializerMethodField()
+    customer_display = serializers.ReadOnlyField()
     calculated_total_credits = serializers.DecimalField(
         max_digits=15, 
         decimal_places=2, 
@@ -560,12 +404,6 @@ class InvoiceCreditSummarySerializer(serializers.ModelSerializer):
             'credit_utilization_percentage'
         ]
     
-    def get_customer_display(self, obj):
-        """Get display name for customer"""
-        if obj.customer:
-            return obj.customer.display_name or obj.customer.company_name
-        return obj.customer_name or "Unknown Customer"
-    
     # Add these methods to the Invoice model to avoid property setter issues
     # OR use these helper methods in the serializer
     
@@ -640,7 +478,7 @@ class CreditValidationResponseSerializer(serializers.Serializer):
 class InvoiceWithCreditInfoSerializer(serializers.ModelSerializer):
     """Enhanced invoice serializer with credit information for dropdowns"""
     
-    customer_display = serializers.SerializerMethodField()
+    customer_display = serializers.ReadOnlyField()
     available_balance = serializers.SerializerMethodField()
     is_fully_credited = serializers.SerializerMethodField()
     
@@ -652,12 +490,6 @@ class InvoiceWithCreditInfoSerializer(serializers.ModelSerializer):
             'available_balance', 'is_fully_credited'
         ]
     
-    def get_customer_display(self, obj):
-        """Get display name for customer"""
-        if obj.customer:
-            return obj.customer.display_name or obj.customer.company_name
-        return obj.customer_name or "Unknown Customer"
-    
     def get_available_balance(self, obj):
         """Get available credit balance"""
         if hasattr(obj, 'available_balance'):
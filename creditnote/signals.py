@@ -0,0 +1,30 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from invoices.models import Invoice
+from creditnote.models import CreditNote
+
+# Changing either column moves the linked invoice's available_balance
+BALANCE_FIELDS = {'related_invoice', 'related_invoice_id', 'total_amt'}
+
+
+@receiver(post_save, sender=CreditNote)
+def refresh_invoice_balance_on_save(sender, instance, update_fields=None, **kwargs):
+    """
+    Recompute available_balance for the invoice the credit note is linked to,
+    and for the one it was linked to when loaded if the link moved.
+    """
+    if update_fields is not None and not BALANCE_FIELDS & set(update_fields):
+        return
+
+    Invoice.objects.refresh_available_balances([
+        getattr(instance, '_loaded_related_invoice_id', None),
+        instance.related_invoice_id,
+    ])
+    instance._loaded_related_invoice_id = instance.related_invoice_id
+
+
+@receiver(post_delete, sender=CreditNote)
+def refresh_invoice_balance_on_delete(sender, instance, **kwargs):
+    """Give the credit note's amount back to the invoice it was linked to."""
+    Invoice.objects.refresh_available_balances([instance.related_invoice_id])
@@ -1,3 +1,234 @@
+import base64
+import datetime
+import json
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from companies.models import ActiveCompany, Company
+from invoices.models import Invoice
+from invoices.services import QuickBooksCreditNoteService
+
+from .custom_services.invoice_filter_service import InvoiceFilterService
+from .models import CreditNote
+
+
+def _credit_line(line_num, amount):
+    return {
+        'LineNum': line_num,
+        'Amount': amount,
+        'DetailType': 'SalesItemLineDetail',
+        'SalesItemLineDetail': {
+            'ItemRef': {'value': str(line_num), 'name': f'Item {line_num}'},
+            'Qty': 1,
+            'UnitPrice': amount,
+        },
+    }
+
+
+class CreditNoteLineSyncTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(
+            name='Acme',
+            access_token='token',
+            access_token_expires_at=timezone.now() + datetime.timedelta(hours=1),
+        )
+        self.service = QuickBooksCreditNoteService(self.company)
+
+    def _credit_data(self, lines):
+        return {
+            'Id': '1',
+            'DocNumber': 'CN-1',
+            'TxnDate': '2024-01-15',
+            'TotalAmt': sum(line['Amount'] for line in lines),
+            'Line': lines,
+        }
+
+    def test_resync_upserts_remaining_lines_and_deletes_missing_ones(self):
+        credit_note = self.service.sync_credit_note_to_db(self._credit_data([
+            _credit_line(1, 10), _credit_line(2, 20), _credit_line(3, 30),
+        ]))
+        original_ids = dict(credit_note.line_items.values_list('line_num', 'id'))
+
+        resynced = self.service.sync_credit_note_to_db(self._credit_data([
+            _credit_line(1, 15), _credit_line(3, 30),
+        ]))
+
+        self.assertEqual(resynced.pk, credit_note.pk)
+        lines = {line.line_num: line for line in resynced.line_items.all()}
+        self.assertEqual(set(lines), {1, 3})
+        self.assertEqual(lines[1].amount, Decimal('15'))
+        # Surviving lines are updated in place rather than recreated
+        self.assertEqual(lines[1].id, original_ids[1])
+        self.assertEqual(lines[3].id, original_ids[3])
+        self.assertEqual(CreditNote.objects.count(), 1)
+
+
+class CreditNoteInvoiceBalanceTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme')
+        self.invoice, self.other_invoice = [
+            Invoice.objects.create(
+                company=self.company,
+                qb_invoice_id=str(i),
+                doc_number=f'INV-{i}',
+                txn_date=datetime.date(2024, 1, 1),
+                total_amt=Decimal('100.00'),
+                sync_token='0',
+            )
+            for i in range(2)
+        ]
+        self.credit_note = CreditNote.objects.create(
+            company=self.company,
+            qb_credit_id='1',
+            doc_number='CN-1',
+            txn_date=datetime.date(2024, 1, 2),
+            total_amt=Decimal('40.00'),
+            related_invoice=self.invoice,
+            sync_token='0',
+        )
+
+    def _balances(self):
+        return dict(Invoice.objects.values_list('doc_number', 'available_balance'))
+
+    def test_link_reduces_balance(self):
+        self.assertEqual(self._balances(), {'INV-0': Decimal('60.00'), 'INV-1': Decimal('100.00')})
+
+    def test_relink_moves_credit_between_invoices(self):
+        credit_note = CreditNote.objects.get(pk=self.credit_note.pk)
+        credit_note.related_invoice = self.other_invoice
+        credit_note.save()
+
+        self.assertEqual(self._balances(), {'INV-0': Decimal('100.00'), 'INV-1': Decimal('60.00')})
+
+    def test_unlink_restores_balance(self):
+        credit_note = CreditNote.objects.get(pk=self.credit_note.pk)
+        credit_note.related_invoice = None
+        credit_note.save(update_fields=['related_invoice'])
+
+        self.assertEqual(self._balances()['INV-0'], Decimal('100.00'))
+
+    def test_delete_restores_balance(self):
+        self.credit_note.delete()
+
+        self.assertEqual(self._balances()['INV-0'], Decimal('100.00'))
+
+    def test_total_amt_change_recomputes_balance(self):
+        self.credit_note.total_amt = Decimal('25.00')
+        self.credit_note.save(update_fields=['total_amt'])
+
+        self.assertEqual(self._balances()['INV-0'], Decimal('75.00'))
+
+    def test_save_without_balance_fields_skips_refresh(self):
+        Invoice.objects.filter(pk=self.invoice.pk).update(available_balance=Decimal('1.00'))
+
+        self.credit_note.doc_number = 'CN-1A'
+        self.credit_note.save(update_fields=['doc_number'])
+
+        self.assertEqual(self._balances()['INV-0'], Decimal('1.00'))
+
+
+def _cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+class AvailableInvoicesCursorTests(TestCase):
+    INVALID_CURSORS = (
+        'not-a-cursor',
+        # Well-formed JSON whose values would only fail inside the query
+        _cursor(['1', '2024-01-01', 'zz']),
+        _cursor(['NaN', '2024-01-01', str(uuid.uuid4())]),
+        _cursor(['Infinity', '2024-01-01', str(uuid.uuid4())]),
+        _cursor(['1', '2024-01-01', 7]),
+    )
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme')
+        # 7 invoices tied on balance, 4 of them also tied on date, then 2 more
+        specs = [(Decimal('100.00'), datetime.date(2024, 1, 1))] * 4
+        specs += [(Decimal('100.00'), datetime.date(2024, 1, 2 + i)) for i in range(3)]
+        specs += [(Decimal('50.00'), datetime.date(2024, 1, 1)), (Decimal('250.00'), datetime.date(2024, 1, 1))]
+        for i, (total_amt, txn_date) in enumerate(specs):
+            Invoice.objects.create(
+                company=self.company,
+                qb_invoice_id=str(i),
+                doc_number=f'INV-{i}',
+                txn_date=txn_date,
+                total_amt=total_amt,
+                sync_token='0',
+            )
+
+    def _expected_ids(self):
+        return list(
+            Invoice.objects.filter(company=self.company)
+            .order_by('-available_balance', '-txn_date', '-id')
+            .values_list('id', flat=True)
+        )
+
+    def test_cursor_walk_visits_every_invoice_once_in_order(self):
+        first_page = InvoiceFilterService.get_invoices_available_for_credit(self.company, page_size=2)
+        seen = [row['id'] for row in first_page['results']]
+        cursor = first_page['next_cursor']
+        pages = []
+        while cursor:
+            page = InvoiceFilterService.get_invoices_available_for_credit(
+                self.company, page_size=2, cursor=cursor
+            )
+            pages.append(page)
+            seen.extend(row['id'] for row in page['results'])
+            cursor = page['next_cursor']
+
+        self.assertEqual(seen, self._expected_ids())
+        self.assertEqual(len(pages), 4)
+        self.assertFalse(pages[-1]['has_next'])
+        self.assertIsNone(pages[-1]['next_cursor'])
+
+    def test_cursor_mode_skips_page_numbers_and_total(self):
+        first_page = InvoiceFilterService.get_invoices_available_for_credit(self.company, page_size=3)
+        self.assertEqual(first_page['page'], 1)
+        self.assertEqual(first_page['total_pages'], 3)
+        self.assertEqual(first_page['total_count'], 9)
+
+        page = InvoiceFilterService.get_invoices_available_for_credit(
+            self.company, page_size=3, cursor=first_page['next_cursor']
+        )
+
+        self.assertIsNone(page['page'])
+        self.assertIsNone(page['total_pages'])
+        self.assertIsNone(page['total_count'])
+        self.assertTrue(page['has_previous'])
+        self.assertEqual(len(page['results']), 3)
+
+    def test_exact_last_page_has_no_next_cursor(self):
+        first_page = InvoiceFilterService.get_invoices_available_for_credit(self.company, page_size=6)
+
+        page = InvoiceFilterService.get_invoices_available_for_credit(
+            self.company, page_size=3, cursor=first_page['next_cursor']
+        )
+
+        self.assertEqual(len(page['results']), 3)
+        self.assertFalse(page['has_next'])
+        self.assertIsNone(page['next_cursor'])
+
+    def test_invalid_cursor_raises_value_error(self):
+        for cursor in self.INVALID_CURSORS:
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                InvoiceFilterService.get_invoices_available_for_credit(self.company, cursor=cursor)
+
+    def test_view_rejects_invalid_cursor(self):
+        user = get_user_model().objects.create_user(email='owner@example.com', password='x')
+        ActiveCompany.objects.update_or_create(user=user, defaults={'company': self.company})
+        client = APIClient()
+        client.force_authenticate(user)
+
+        for cursor in self.INVALID_CURSORS:
+            with self.subTest(cursor=cursor):
+                response = client.get(reverse('creditnote-available-invoices'), {'cursor': cursor})
 
-# Create your tests here.
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data, {'success': False, 'error': 'Invalid cursor'})
@@ -3,7 +3,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.core.paginator import Paginator
-from django.db.models import Q, Prefetch, Sum, Count, Avg
+from django.db.models import Q, Sum, Count, Avg
 from .models import CreditNote, CreditNoteLine
 from .serializers import (
     CreditNoteSerializer, 
@@ -17,7 +17,7 @@ from .serializers import (
 from invoices.models import Invoice
 from invoices.services import QuickBooksCreditNoteService
 from companies.models import ActiveCompany
-from kra.models import KRAInvoiceSubmission
+from kra.models import KRAInvoiceSubmission, KRA_VALIDATED_STATUSES, KRA_PENDING_STATUSES
 from customers.models import Customer
 from customers.services import QuickBooksCustomerService
 import requests
@@ -42,6 +42,7 @@ from creditnote.serializers import (
 
 )
 from customers.serializers import SimpleCustomerSerializer
+from invoices.serializers import KRASubmissionSerializer
 
 
 def get_active_company(user):
@@ -56,12 +57,14 @@ def get_active_company(user):
 def generate_credit_note_pdf(request, credit_note_id):
     """Generate PDF version of credit note - same as invoice PDF generation"""
     try:
-        credit_note = get_object_or_404(CreditNote, id=credit_note_id)
+        credit_note = get_object_or_404(
+            CreditNote.objects.select_related('company'), id=credit_note_id
+        )
         company = credit_note.company
         
         # Get KRA submission - same as invoices
         kra_submission = credit_note.kra_submissions.filter(
-            status__in=['success', 'signed']
+            status__in=KRA_VALIDATED_STATUSES
         ).first()
 
         if hasattr(company, 'brand_color') and company.brand_color:
@@ -120,11 +123,13 @@ def generate_credit_note_pdf(request, credit_note_id):
 def credit_note_detail_html(request, credit_note_id):
     """HTML view of credit note (no login required) - same as invoices"""
     try:
-        credit_note = get_object_or_404(CreditNote, id=credit_note_id)
+        credit_note = get_object_or_404(
+            CreditNote.objects.select_related('company'), id=credit_note_id
+        )
         company = credit_note.company
 
         kra_submission = credit_note.kra_submissions.filter(
-            status__in=['success', 'signed']
+            status__in=KRA_VALIDATED_STATUSES
         ).first()
 
         context = {
@@ -176,26 +181,15 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
         if not active_company:
             return CreditNote.objects.none()
 
-        # Prefetch related invoice with customer data
-        related_invoice_prefetch = Prefetch(
-            'related_invoice',
-            queryset=Invoice.objects.select_related('customer')
-        )
-
-        # Prefetch KRA submissions to avoid N+1 queries - same as invoices
-        kra_submissions_prefetch = Prefetch(
-            'kra_submissions',
-            queryset=KRAInvoiceSubmission.objects.select_related('company').order_by('-created_at')
-        )
-
-        queryset = CreditNote.objects.filter(
-            company=active_company
-        ).select_related('company', 'related_invoice').prefetch_related(
-            'line_items',
-            related_invoice_prefetch,
-            kra_submissions_prefetch
+        queryset = CreditNoteSerializer.setup_eager_loading(
+            CreditNote.objects.with_status().filter(company=active_company)
         ).order_by('-txn_date')
 
+        if self.action == 'list':
+            # The list serializer never reads the invoice's raw QB payload; the
+            # detail serializer's currency checks fall back to it, so keep it there
+            queryset = queryset.defer('related_invoice__raw_data')
+
         # Apply search filter
         search = self.request.query_params.get('search')
         if search:
@@ -220,14 +214,10 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
         if kra_validated is not None:
             if kra_validated.lower() == 'true':
                 # Credit notes with at least one successful KRA submission
-                queryset = queryset.filter(
-                    kra_submissions__status__in=['success', 'signed']
-                ).distinct()
+                queryset = queryset.filter(is_kra_validated=True)
             elif kra_validated.lower() == 'false':
                 # Credit notes without successful KRA submissions
-                queryset = queryset.exclude(
-                    kra_submissions__status__in=['success', 'signed']
-                )
+                queryset = queryset.filter(is_kra_validated=False)
 
         return queryset
 
@@ -276,7 +266,7 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
             'successful_submissions': KRAInvoiceSubmission.objects.filter(
                 company=active_company, 
                 document_type='credit_note',
-                status__in=['success', 'signed']
+                status__in=KRA_VALIDATED_STATUSES
             ).count(),
             'failed_submissions': KRAInvoiceSubmission.objects.filter(
                 company=active_company, 
@@ -286,7 +276,7 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
             'pending_submissions': KRAInvoiceSubmission.objects.filter(
                 company=active_company, 
                 document_type='credit_note',
-                status__in=['pending', 'submitted']
+                status__in=KRA_PENDING_STATUSES
             ).count()
         }
 
@@ -335,14 +325,14 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
         instance = self.get_object()
         serializer = CreditNoteDetailSerializer(instance)
         
-        # Get additional KRA submission details - same as invoices
-        kra_submissions = instance.kra_submissions.all().order_by('-created_at')
-        from kra.serializers import KRASubmissionSerializer
-        kra_serializer = KRASubmissionSerializer(kra_submissions, many=True)
-        
         response_data = serializer.data
-        response_data['kra_submissions_detail'] = kra_serializer.data
-        response_data['kra_submissions_count'] = kra_submissions.count()
+        
+        # Additional KRA submission details - same as invoices. The detail
+        # serializer already rendered the prefetched submissions (newest first)
+        # with KRASubmissionSerializer, so reuse that rather than walk them again
+        kra_submissions = response_data['kra_submissions']
+        response_data['kra_submissions_detail'] = kra_submissions
+        response_data['kra_submissions_count'] = len(kra_submissions)
         
         return Response({
             'success': True,
@@ -353,9 +343,9 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
     def kra_submissions(self, request, pk=None):
         """Get all KRA submissions for a specific credit note"""
         credit_note = self.get_object()
-        submissions = credit_note.kra_submissions.all().order_by('-created_at')
+        # Prefetched newest first by get_queryset
+        submissions = list(credit_note.kra_submissions.all())
         
-        from kra.serializers import KRASubmissionSerializer
         serializer = KRASubmissionSerializer(submissions, many=True)
         
         return Response({
@@ -364,8 +354,8 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
             'credit_note_number': credit_note.doc_number,
             'customer_name': credit_note.customer_name,
             'kra_submissions': serializer.data,
-            'total_submissions': submissions.count(),
-            'latest_submission': KRASubmissionSerializer(submissions.first()).data if submissions.exists() else None
+            'total_submissions': len(submissions),
+            'latest_submission': serializer.data[0] if submissions else None
         })
 
     @action(detail=True, methods=['post'])
@@ -446,7 +436,9 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
     def line_items(self, request, pk=None):
         """Get all line items for a specific credit note"""
         credit_note = self.get_object()
-        line_items = credit_note.line_items.all().order_by('line_num')
+        # Prefetched by get_queryset, already in line_num order (Meta.ordering);
+        # re-ordering here would discard the prefetch and query again
+        line_items = list(credit_note.line_items.all())
         
         serializer = CreditNoteLineSerializer(line_items, many=True)
         
@@ -455,7 +447,7 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
             'credit_note_id': str(credit_note.id),
             'credit_note_number': credit_note.doc_number,
             'line_items': serializer.data,
-            'total_line_items': line_items.count(),
+            'total_line_items': len(line_items),
             'total_amount': float(credit_note.total_amt),
             'subtotal': float(credit_note.subtotal),
             'tax_total': float(credit_note.tax_total)
@@ -678,6 +670,7 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
             min_balance = request.query_params.get('min_balance')
             page = int(request.query_params.get('page', 1))
             page_size = min(int(request.query_params.get('page_size', 20)), 100)
+            cursor = request.query_params.get('cursor') or None
             
             # Parse min_balance if provided
             min_available_balance = None
@@ -688,46 +681,47 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
                     min_available_balance = None
 
             # Use the filtering service to get available invoices WITH PAGINATION
-            paginated_results = InvoiceFilterService.get_invoices_available_for_credit(
-                company=active_company,
-                search=search,
-                customer_name=customer_name,
-                min_available_balance=min_available_balance,
-                exclude_fully_credited=True,
-                page=page,
-                page_size=page_size
-            )
+            try:
+                paginated_results = InvoiceFilterService.get_invoices_available_for_credit(
+                    company=active_company,
+                    search=search,
+                    customer_name=customer_name,
+                    min_available_balance=min_available_balance,
+                    exclude_fully_credited=True,
+                    page=page,
+                    page_size=page_size,
+                    customer_fields=SimpleCustomerSerializer.Meta.fields,
+                    cursor=cursor
+                )
+            except ValueError as e:
+                return Response({
+                    'success': False,
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
             
             # Get summary statistics
             summary = InvoiceFilterService.get_invoices_summary(active_company)
             
-            # Prepare response data - annotations should be preserved
+            # Prepare response data from the service's row dicts
             invoices_data = []
             for invoice in paginated_results['results']:
-                # Get customer display name
-                customer_display = ""
-                if invoice.customer:
-                    customer_display = invoice.customer.display_name or invoice.customer.company_name
-                else:
-                    customer_display = invoice.customer_name or "Unknown Customer"
+                customer = invoice['customer']
                 
-                # Access annotated fields - they should now be preserved
-                available_balance = invoice.available_balance
-                calculated_total_credits = invoice.calculated_total_credits
+                available_balance = invoice['available_balance']
                 
                 # Check if invoice is fully credited
                 is_fully_credited = available_balance <= Decimal('0.01')
                 
                 invoices_data.append({
-                    'id': invoice.id,
-                    'doc_number': invoice.doc_number,
-                    'qb_invoice_id': invoice.qb_invoice_id,
-                    'txn_date': invoice.txn_date,
-                    'total_amt': invoice.total_amt,
-                    'customer': SimpleCustomerSerializer(invoice.customer).data if invoice.customer else None,
-                    'customer_display': customer_display,
+                    'id': invoice['id'],
+                    'doc_number': invoice['doc_number'],
+                    'qb_invoice_id': invoice['qb_invoice_id'],
+                    'txn_date': invoice['txn_date'],
+                    'total_amt': invoice['total_amt'],
+                    'customer': customer,
+                    'customer_display': invoice['customer_display'],
                     'available_balance': available_balance,
-                    'calculated_total_credits': calculated_total_credits,
+                    'calculated_total_credits': invoice['total_credits_applied'],
                     'is_fully_credited': is_fully_credited,
                 })
             
@@ -738,9 +732,11 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
                     'count': paginated_results['total_count'],
                     'page': paginated_results['page'],
                     'page_size': paginated_results['page_size'],
-                    'next': paginated_results['page'] + 1 if paginated_results['has_next'] else None,
-                    'previous': paginated_results['page'] - 1 if paginated_results['has_previous'] else None,
-                    'total_pages': paginated_results['total_pages']
+                    'next': paginated_results['page'] + 1 if paginated_results['has_next'] and not cursor else None,
+                    'previous': paginated_results['page'] - 1 if paginated_results['has_previous'] and not cursor else None,
+                    'total_pages': paginated_results['total_pages'],
+                    # Pass back as ?cursor= to seek to the following page
+                    'next_cursor': paginated_results['next_cursor']
                 },
                 'summary': summary
             })
@@ -807,8 +803,8 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
         # KRA statistics - using the same KRAInvoiceSubmission model
         kra_validated_credit_notes = CreditNote.objects.filter(
             company=active_company,
-            kra_submissions__status__in=['success', 'signed']
-        ).distinct().count()
+            is_kra_validated=True
+        ).count()
 
         return Response({
             'success': True,
@@ -837,10 +833,8 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
                 'error': 'No active company selected'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        recent_credit_notes = CreditNote.objects.filter(
-            company=active_company
-        ).select_related('company', 'related_invoice').prefetch_related(
-            Prefetch('kra_submissions', queryset=KRAInvoiceSubmission.objects.order_by('-created_at'))
+        recent_credit_notes = CreditNoteSummarySerializer.setup_eager_loading(
+            CreditNote.objects.with_status().filter(company=active_company)
         ).order_by('-created_at')[:10]
 
         serializer = CreditNoteSummarySerializer(recent_credit_notes, many=True)
@@ -976,7 +970,7 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
             is_valid, error, details = CreditNoteValidationService.validate_credit_amount(
                 credit_note.total_amt,
                 str(credit_note.related_invoice.id),
-                str(credit_note.company.id) if credit_note.company else None
+                str(credit_note.company_id) if credit_note.company_id else None
             )
             
             response_data = {
@@ -1076,18 +1070,11 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
             # Prepare response data manually since serializer might not handle annotated fields
             invoices_data = []
             for invoice in invoices:
-                # Get customer display name
-                customer_display = ""
-                if invoice.customer:
-                    customer_display = invoice.customer.display_name or invoice.customer.company_name
-                else:
-                    customer_display = invoice.customer_name or "Unknown Customer"
-                
                 # Get available balance from annotated field
                 available_balance = getattr(invoice, 'available_balance', invoice.total_amt)
                 
                 # Get total credits applied from annotated field
-                calculated_total_credits = getattr(invoice, 'calculated_total_credits', Decimal('0.00'))
+                calculated_total_credits = getattr(invoice, 'total_credits_applied', Decimal('0.00'))
                 
                 # Calculate credit utilization percentage
                 credit_utilization_percentage = Decimal('0.00')
@@ -1103,7 +1090,7 @@ class CreditNoteViewSet(viewsets.ReadOnlyModelViewSet):
                     'is_fully_credited': available_balance <= Decimal('0.01'),
                     'credit_utilization_percentage': credit_utilization_percentage,
                     'customer_name': invoice.customer_name,
-                    'customer_display': customer_display,
+                    'customer_display': invoice.customer_display,
                 })
             
             return Response({
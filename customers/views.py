@@ -433,9 +433,11 @@ class CustomerViewSet(viewsets.ModelViewSet):
             customer = self.get_object()
             
             # Get both directly linked invoices and invoices by QB reference
-            invoices = Invoice.objects.filter(
-                Q(company=customer.company) &
-                (Q(customer=customer) | Q(customer_ref_value=customer.qb_customer_id))
+            invoices = InvoiceSerializer.setup_eager_loading(
+                Invoice.objects.filter(
+                    Q(company=customer.company) &
+                    (Q(customer=customer) | Q(customer_ref_value=customer.qb_customer_id))
+                )
             ).order_by('-txn_date')
             
             page = int(request.query_params.get('page', 1))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:56
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_available_balance(apps, schema_editor):
+    """
+    Set available_balance = total_amt - linked credit note totals for every
+    invoice, in one UPDATE.
+    """
+    Invoice = apps.get_model('invoices', 'Invoice')
+    CreditNote = apps.get_model('creditnote', 'CreditNote')
+    money = models.DecimalField(max_digits=15, decimal_places=2)
+    credits = CreditNote.objects.filter(
+        related_invoice=OuterRef('pk')
+    ).values('related_invoice').annotate(
+        total_credits=Sum('total_amt')
+    ).values('total_credits')
+    Invoice.objects.update(
+        available_balance=F('total_amt') - Coalesce(
+            Subquery(credits, output_field=money),
+            Value(Decimal('0.00'), output_field=money)
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0006_remove_companymembership_companies_c_user_id_ae9f2c_idx_and_more'),
+        ('customers', '0001_initial'),
+        ('invoices', '0003_remove_invoice_balance_kes_and_more'),
+        ('creditnote', '0008_backfill_creditnote_currency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='available_balance',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Amount still available for credit notes (may be negative)', max_digits=15),
+        ),
+        migrations.RunPython(backfill_available_balance, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['company', 'available_balance'], name='inv_company_avail_idx'),
+        ),
+    ]
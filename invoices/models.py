@@ -1,15 +1,80 @@
 from django.db import models
+from django.apps import apps
 from django.conf import settings
 from common.models import TimeStampModel
 from companies.models import Company
 from customers.models import Customer
-from django.db.models import Sum
+from django.db.models import Sum, Value, F, Case, When, Subquery, OuterRef
+from django.db.models.functions import Coalesce, Greatest, NullIf
 from decimal import Decimal
 import json
 
 
 User = settings.AUTH_USER_MODEL
 
+# Shared by the manager's money expressions; expressions are copied when a
+# query resolves them, so one instance can back every queryset
+MONEY_FIELD = models.DecimalField(max_digits=15, decimal_places=2)
+ZERO_MONEY = Value(Decimal('0.00'), output_field=MONEY_FIELD)
+
+# SQL counterpart of Invoice.customer_display; NullIf keeps the property's
+# treatment of empty names (`or`), which Coalesce alone would return
+CUSTOMER_DISPLAY = Case(
+    When(
+        customer__isnull=False,
+        then=Coalesce(NullIf('customer__display_name', Value('')), 'customer__company_name')
+    ),
+    default=Coalesce(NullIf('customer_name', Value('')), Value('Unknown Customer')),
+    output_field=models.CharField()
+)
+
+
+class InvoiceManager(models.Manager):
+    def with_credit_summary(self):
+        """
+        Invoices annotated with their credit summary, computed in the same query:
+        calc_total_credits (sum of linked credit note totals),
+        calc_available_balance (never negative) and calc_is_fully_credited
+        (1 cent tolerance, matching Invoice.is_fully_credited).
+        """
+        return self.get_queryset().annotate(
+            calc_total_credits=Coalesce(Sum('credit_notes__total_amt'), ZERO_MONEY),
+        ).annotate(
+            calc_available_balance=Greatest(
+                F('total_amt') - F('calc_total_credits'),
+                ZERO_MONEY,
+                output_field=MONEY_FIELD
+            ),
+        ).annotate(
+            calc_is_fully_credited=Case(
+                When(calc_available_balance__lte=Decimal('0.01'), then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField()
+            ),
+        )
+
+    def refresh_available_balances(self, invoice_ids):
+        """
+        Recompute the stored available_balance of the given invoices from their
+        linked credit notes in a single UPDATE. None ids are ignored.
+        """
+        invoice_ids = {pk for pk in invoice_ids if pk is not None}
+        if not invoice_ids:
+            return 0
+        # creditnote.models imports this module, so resolve CreditNote lazily
+        CreditNote = apps.get_model('creditnote', 'CreditNote')
+        credits = CreditNote.objects.filter(
+            related_invoice=OuterRef('pk')
+        ).values('related_invoice').annotate(
+            total_credits=Sum('total_amt')
+        ).values('total_credits')
+        return self.get_queryset().filter(pk__in=invoice_ids).update(
+            available_balance=F('total_amt') - Coalesce(
+                Subquery(credits, output_field=MONEY_FIELD), ZERO_MONEY
+            )
+        )
+
+
 class Invoice(TimeStampModel):
     """QuickBooks Invoice model"""
     
@@ -39,6 +104,15 @@ class Invoice(TimeStampModel):
     subtotal = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     tax_total = models.DecimalField(max_digits=15, decimal_places=2, default=0)
 
+    # total_amt less linked credit notes; maintained by Invoice.save() and the
+    # creditnote signals via InvoiceManager.refresh_available_balances()
+    available_balance = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0,
+        help_text="Amount still available for credit notes (may be negative)"
+    )
+
     is_kra_validated = models.BooleanField(default=False)
     
     # Enhanced tax information
@@ -78,6 +152,8 @@ class Invoice(TimeStampModel):
     
     # Raw QB data
     raw_data = models.JSONField(blank=True, null=True)
+
+    objects = InvoiceManager()
     
     class Meta:
         unique_together = ('company', 'qb_invoice_id')
@@ -87,7 +163,30 @@ class Invoice(TimeStampModel):
             models.Index(fields=['customer']),
             models.Index(fields=['customer_name']),
             models.Index(fields=['currency_ref_value']),  # Optional: add if you want to query by currency
+            # Available-for-credit listing filters and orders on the stored balance
+            models.Index(fields=['company', 'available_balance'], name='inv_company_avail_idx'),
         ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding:
+            # No credit note can reference an invoice before it exists
+            self.available_balance = self.total_amt
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if not adding and (update_fields is None or 'total_amt' in update_fields):
+            Invoice.objects.refresh_available_balances([self.pk])
+            # Now stale on this instance; leave it deferred so it reloads on access
+            self.__dict__.pop('available_balance', None)
+    
+    @property
+    def customer_display(self):
+        """Customer name to show: the linked customer's, else the QB name"""
+        if 'calc_customer_display' in self.__dict__:
+            return self.calc_customer_display
+        if self.customer:
+            return self.customer.display_name or self.customer.company_name
+        return self.customer_name or "Unknown Customer"
     
     # LAZY CALCULATION PROPERTIES FOR KES AMOUNTS
     # These are calculated on-the-fly without storing in database
@@ -1,8 +1,9 @@
 # invoices/serializers.py
 from rest_framework import serializers
+from django.db.models import Prefetch
 from .models import Invoice, InvoiceLine
 from companies.models import Company
-from kra.models import KRAInvoiceSubmission
+from kra.models import KRAInvoiceSubmission, KRA_VALIDATED_STATUSES
 from customers.models import Customer  
 from decimal import Decimal
 
@@ -76,16 +77,17 @@ class InvoiceSerializer(serializers.ModelSerializer):
     line_items = InvoiceLineSerializer(many=True, read_only=True)
     
     # CURRENCY FIELDS - invoice specific (not company)
-    currency_code = serializers.SerializerMethodField()
+    # (from the Invoice properties, which keep the exchange rate a Decimal)
+    currency_code = serializers.ReadOnlyField(source='effective_currency')
     currency_name = serializers.SerializerMethodField()
-    exchange_rate = serializers.SerializerMethodField()
-    is_foreign_currency = serializers.SerializerMethodField()
+    exchange_rate = serializers.FloatField(source='effective_exchange_rate', read_only=True)
+    is_foreign_currency = serializers.ReadOnlyField()
     
     # KES EQUIVALENTS (optional, for reporting)
-    total_amt_kes = serializers.SerializerMethodField()
-    balance_kes = serializers.SerializerMethodField()
-    subtotal_kes = serializers.SerializerMethodField()
-    tax_total_kes = serializers.SerializerMethodField()
+    total_amt_kes = serializers.FloatField(read_only=True)
+    balance_kes = serializers.FloatField(read_only=True)
+    subtotal_kes = serializers.FloatField(read_only=True)
+    tax_total_kes = serializers.FloatField(read_only=True)
     
     # Status and validation fields
     status = serializers.SerializerMethodField()
@@ -129,15 +131,6 @@ class InvoiceSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
     # CURRENCY METHODS
-    def get_currency_code(self, obj):
-        """Get the original currency code (USD, KES, EUR, etc.)"""
-        if hasattr(obj, 'effective_currency'):
-            return obj.effective_currency  # From lazy calculation property
-        elif hasattr(obj, 'currency_ref_value') and obj.currency_ref_value:
-            return obj.currency_ref_value  # From database field
-        else:
-            return 'KES'  # Default
-
     def get_currency_name(self, obj):
         """Get the currency name (United States Dollar, Kenyan Shilling, etc.)"""
         if hasattr(obj, 'currency_name') and obj.currency_name:
@@ -155,72 +148,6 @@ class InvoiceSerializer(serializers.ModelSerializer):
         else:
             return 'Kenyan Shilling'  # Default
 
-    def get_exchange_rate(self, obj):
-        """Get exchange rate used for this invoice"""
-        if hasattr(obj, 'effective_exchange_rate'):
-            return float(obj.effective_exchange_rate)
-        elif hasattr(obj, 'exchange_rate'):
-            return float(obj.exchange_rate)
-        else:
-            return 1.0  # Default for KES or missing rate
-
-    def get_is_foreign_currency(self, obj):
-        """Check if invoice is in foreign currency (not KES)"""
-        if hasattr(obj, 'is_foreign_currency'):
-            return obj.is_foreign_currency
-        else:
-            currency = self.get_currency_code(obj)
-            return currency != 'KES'
-
-    # KES EQUIVALENT METHODS
-    def get_total_amt_kes(self, obj):
-        """Get total amount in KES (calculated)"""
-        if hasattr(obj, 'total_amt_kes'):
-            return float(obj.total_amt_kes)
-        else:
-            # Calculate on the fly if lazy property not available
-            currency = self.get_currency_code(obj)
-            exchange_rate = self.get_exchange_rate(obj)
-            if currency != 'KES':
-                return float(obj.total_amt * Decimal(str(exchange_rate)))
-            return float(obj.total_amt)
-
-    def get_balance_kes(self, obj):
-        """Get balance in KES (calculated)"""
-        if hasattr(obj, 'balance_kes'):
-            return float(obj.balance_kes)
-        else:
-            # Calculate on the fly
-            currency = self.get_currency_code(obj)
-            exchange_rate = self.get_exchange_rate(obj)
-            if currency != 'KES':
-                return float(obj.balance * Decimal(str(exchange_rate)))
-            return float(obj.balance)
-
-    def get_subtotal_kes(self, obj):
-        """Get subtotal in KES (calculated)"""
-        if hasattr(obj, 'subtotal_kes'):
-            return float(obj.subtotal_kes)
-        else:
-            # Calculate on the fly
-            currency = self.get_currency_code(obj)
-            exchange_rate = self.get_exchange_rate(obj)
-            if currency != 'KES':
-                return float(obj.subtotal * Decimal(str(exchange_rate)))
-            return float(obj.subtotal)
-
-    def get_tax_total_kes(self, obj):
-        """Get tax total in KES (calculated)"""
-        if hasattr(obj, 'tax_total_kes'):
-            return float(obj.tax_total_kes)
-        else:
-            # Calculate on the fly
-            currency = self.get_currency_code(obj)
-            exchange_rate = self.get_exchange_rate(obj)
-            if currency != 'KES':
-                return float(obj.tax_total * Decimal(str(exchange_rate)))
-            return float(obj.tax_total)
-
     # STATUS METHODS
     def get_status(self, obj):
         """Determine invoice status based on balance"""
@@ -231,13 +158,40 @@ class InvoiceSerializer(serializers.ModelSerializer):
         else:
             return 'partial'
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Join the customer and prefetch line items and KRA submissions so lists
+        don't query per invoice. Submissions come newest first, in
+        kra_submissions_latest_first: ordering the related manager per row would
+        bypass a plain prefetch.
+        """
+        return queryset.select_related('customer').prefetch_related(
+            'line_items',
+            Prefetch(
+                'kra_submissions',
+                queryset=KRAInvoiceSubmission.objects.order_by('-created_at'),
+                to_attr='kra_submissions_latest_first'
+            )
+        )
+
+    def _kra_submissions_latest_first(self, obj):
+        """KRA submissions newest first, from setup_eager_loading when applied"""
+        if hasattr(obj, 'kra_submissions_latest_first'):
+            return obj.kra_submissions_latest_first
+        return list(obj.kra_submissions.order_by('-created_at'))
+
     def get_is_kra_validated(self, obj):
         """Check if invoice has been successfully validated with KRA"""
-        return obj.kra_submissions.filter(status__in=['success', 'signed']).exists()
+        return any(
+            submission.status in KRA_VALIDATED_STATUSES
+            for submission in self._kra_submissions_latest_first(obj)
+        )
 
     def get_kra_submission(self, obj):
         """Get the latest KRA submission for this invoice (backward compatibility)"""
-        latest_submission = obj.kra_submissions.order_by('-created_at').first()
+        submissions = self._kra_submissions_latest_first(obj)
+        latest_submission = submissions[0] if submissions else None
         if latest_submission:
             return KRASubmissionSerializer(latest_submission).data
         return None
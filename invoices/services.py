@@ -956,34 +956,36 @@ class QuickBooksCreditNoteService:
                 credit_note.template_name = template_ref.get("name")
                 credit_note.save(update_fields=["template_id", "template_name"])
 
-            # Clear existing line items if updating
-            if not created:
-                credit_note.line_items.all().delete()
-
-            # Create line items with enhanced tax information
-            line_items_created = 0
+            # Upsert line items with enhanced tax information in batched statements
+            line_records = []
             for line_data in credit_data.get('Line', []):
                 if line_data.get('DetailType') == 'SalesItemLineDetail':
                     detail = line_data.get('SalesItemLineDetail', {})
                     
                     tax_code_ref, tax_amount, line_tax_percent = self.extract_credit_line_item_tax(line_data, credit_note.tax_percent)
                     
-                    CreditNoteLine.objects.create(
-                        credit_note=credit_note,
-                        line_num=line_data.get('LineNum', 0),
-                        item_ref_value=detail.get('ItemRef', {}).get('value'),
-                        item_name=detail.get('ItemRef', {}).get('name'),
-                        description=line_data.get('Description', ''),
-                        qty=Decimal(str(detail.get('Qty', 0))),
-                        unit_price=Decimal(str(detail.get('UnitPrice', 0))),
-                        amount=Decimal(str(line_data.get('Amount', 0))),
-                        tax_code_ref=tax_code_ref,
-                        tax_rate_ref=credit_note.tax_rate_ref,
-                        tax_percent=line_tax_percent,
-                        tax_amount=tax_amount,
-                        raw_data=line_data
-                    )
-                    line_items_created += 1
+                    line_records.append({
+                        'credit_note': credit_note,
+                        'line_num': line_data.get('LineNum', 0),
+                        'item_ref_value': detail.get('ItemRef', {}).get('value'),
+                        'item_name': detail.get('ItemRef', {}).get('name'),
+                        'description': line_data.get('Description', ''),
+                        'qty': Decimal(str(detail.get('Qty', 0))),
+                        'unit_price': Decimal(str(detail.get('UnitPrice', 0))),
+                        'amount': Decimal(str(line_data.get('Amount', 0))),
+                        'tax_code_ref': tax_code_ref,
+                        'tax_rate_ref': credit_note.tax_rate_ref,
+                        'tax_percent': line_tax_percent,
+                        'tax_amount': tax_amount,
+                        'raw_data': line_data
+                    })
+            CreditNoteLine.bulk_upsert(line_records)
+
+            # Drop lines that are no longer on the credit note
+            if not created:
+                credit_note.line_items.exclude(
+                    line_num__in=[record['line_num'] for record in line_records]
+                ).delete()
 
             action = 'created' if created else 'updated'
             logger.info(f"✅ Credit Note {credit_note.doc_number} {action} - Customer: {credit_note.customer_name}")
@@ -1,3 +1,84 @@
+import datetime
+from decimal import Decimal
+from importlib import import_module
+
+from django.apps import apps
 from django.test import TestCase
 
-# Create your tests here.
+from companies.models import Company
+from creditnote.models import CreditNote
+
+from .models import Invoice
+
+backfill_available_balance = import_module(
+    'invoices.migrations.0004_invoice_available_balance'
+).backfill_available_balance
+
+
+class InvoiceAvailableBalanceTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme')
+        self.invoice = Invoice.objects.create(
+            company=self.company,
+            qb_invoice_id='1',
+            doc_number='INV-1',
+            txn_date=datetime.date(2024, 1, 1),
+            total_amt=Decimal('100.00'),
+            sync_token='0',
+        )
+        CreditNote.objects.create(
+            company=self.company,
+            qb_credit_id='1',
+            doc_number='CN-1',
+            txn_date=datetime.date(2024, 1, 2),
+            total_amt=Decimal('40.00'),
+            related_invoice=self.invoice,
+            sync_token='0',
+        )
+
+    def _stored_balance(self):
+        return Invoice.objects.values_list('available_balance', flat=True).get(pk=self.invoice.pk)
+
+    def test_new_invoice_starts_with_its_total(self):
+        invoice = Invoice.objects.create(
+            company=self.company,
+            qb_invoice_id='2',
+            doc_number='INV-2',
+            txn_date=datetime.date(2024, 1, 1),
+            total_amt=Decimal('75.00'),
+            sync_token='0',
+        )
+
+        self.assertEqual(invoice.available_balance, Decimal('75.00'))
+
+    def test_total_amt_change_recomputes_balance(self):
+        self.invoice.total_amt = Decimal('150.00')
+        self.invoice.save()
+
+        self.assertEqual(self._stored_balance(), Decimal('110.00'))
+        self.assertEqual(self.invoice.available_balance, Decimal('110.00'))
+
+    def test_save_without_total_amt_skips_refresh(self):
+        Invoice.objects.filter(pk=self.invoice.pk).update(available_balance=Decimal('1.00'))
+
+        self.invoice.doc_number = 'INV-1A'
+        self.invoice.save(update_fields=['doc_number'])
+
+        self.assertEqual(self._stored_balance(), Decimal('1.00'))
+
+    def test_migration_backfill_subtracts_linked_credits(self):
+        unlinked = Invoice.objects.create(
+            company=self.company,
+            qb_invoice_id='2',
+            doc_number='INV-2',
+            txn_date=datetime.date(2024, 1, 1),
+            total_amt=Decimal('80.00'),
+            sync_token='0',
+        )
+        Invoice.objects.update(available_balance=Decimal('0.00'))
+
+        backfill_available_balance(apps, None)
+
+        self.assertEqual(self._stored_balance(), Decimal('60.00'))
+        unlinked.refresh_from_db()
+        self.assertEqual(unlinked.available_balance, Decimal('80.00'))
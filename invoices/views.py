@@ -35,7 +35,9 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         if not active_company:
             return Invoice.objects.none()
         
-        queryset = Invoice.objects.filter(company=active_company).order_by('-txn_date')
+        queryset = InvoiceSerializer.setup_eager_loading(
+            Invoice.objects.filter(company=active_company)
+        ).order_by('-txn_date')
         
         # Apply search filter
         search = self.request.query_params.get("search")
@@ -5,3 +5,6 @@ class KraConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'kra'
     verbose_name = 'KRA Integration'
+
+    def ready(self):
+        import kra.signals
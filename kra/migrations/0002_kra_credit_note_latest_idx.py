@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0006_remove_companymembership_companies_c_user_id_ae9f2c_idx_and_more'),
+        ('creditnote', '0009_creditnote_status_indexes'),
+        ('invoices', '0004_invoice_available_balance'),
+        ('kra', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='krainvoicesubmission',
+            name='kra_krainvo_credit__b20d91_idx',
+        ),
+        migrations.AddIndex(
+            model_name='krainvoicesubmission',
+            index=models.Index(fields=['credit_note', '-created_at'], name='kra_cn_latest_idx'),
+        ),
+    ]
@@ -8,6 +8,10 @@ from common.models import TimeStampModel
 from django.utils import timezone
 from creditnote.models import CreditNote
 
+# Submission statuses that count as validated / still awaiting a KRA outcome
+KRA_VALIDATED_STATUSES = frozenset({'success', 'signed'})
+KRA_PENDING_STATUSES = frozenset({'pending', 'submitted'})
+
 
 class KRACompanyConfig(TimeStampModel):
     """KRA configuration for each company"""
@@ -96,7 +100,8 @@ class KRAInvoiceSubmission(TimeStampModel):
         indexes = [
             models.Index(fields=['company', 'status']),
             models.Index(fields=['invoice']),
-            models.Index(fields=['credit_note']),
+            # Newest submission per credit note; also serves credit_note lookups
+            models.Index(fields=['credit_note', '-created_at'], name='kra_cn_latest_idx'),
             models.Index(fields=['kra_invoice_number']),
             models.Index(fields=['document_type']),
             models.Index(fields=['trd_invoice_no']),
@@ -165,7 +170,7 @@ class KRAInvoiceSubmission(TimeStampModel):
     @property
     def is_successful(self):
         """Check if submission was successful"""
-        return self.status in ['success', 'signed']
+        return self.status in KRA_VALIDATED_STATUSES
 
     @property
     def can_retry(self):
@@ -0,0 +1,37 @@
+from django.db.models import Exists, OuterRef
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from creditnote.models import CreditNote
+from kra.models import KRAInvoiceSubmission, KRA_VALIDATED_STATUSES
+
+
+def refresh_credit_note_kra_validated(credit_note_id):
+    """
+    Set the credit note's stored is_kra_validated from its submissions in a
+    single UPDATE: true while any of them has a validated status.
+    """
+    CreditNote.objects.filter(pk=credit_note_id).update(
+        is_kra_validated=Exists(
+            KRAInvoiceSubmission.objects.filter(
+                credit_note=OuterRef('pk'), status__in=KRA_VALIDATED_STATUSES
+            )
+        )
+    )
+
+
+@receiver(post_save, sender=KRAInvoiceSubmission)
+def refresh_kra_validated_on_save(sender, instance, update_fields=None, **kwargs):
+    """Keep the credit note's is_kra_validated in step with submission status."""
+    if instance.credit_note_id is None:
+        return
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    refresh_credit_note_kra_validated(instance.credit_note_id)
+
+
+@receiver(post_delete, sender=KRAInvoiceSubmission)
+def refresh_kra_validated_on_delete(sender, instance, **kwargs):
+    """A deleted submission may have been the credit note's only validated one."""
+    if instance.credit_note_id is not None:
+        refresh_credit_note_kra_validated(instance.credit_note_id)
@@ -1,3 +1,102 @@
+import datetime
+from decimal import Decimal
+from importlib import import_module
+
+from django.apps import apps
 from django.test import TestCase
 
-# Create your tests here.
+from companies.models import Company
+from creditnote.models import CreditNote
+
+from .models import KRAInvoiceSubmission
+
+backfill_kra_validated = import_module(
+    'creditnote.migrations.0010_creditnote_is_kra_validated_index'
+).backfill_kra_validated
+
+
+class CreditNoteKRAValidatedTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme')
+        self.credit_note = CreditNote.objects.create(
+            company=self.company,
+            qb_credit_id='1',
+            doc_number='CN-1',
+            txn_date=datetime.date(2024, 1, 2),
+            total_amt=Decimal('40.00'),
+            sync_token='0',
+        )
+        self.kra_invoice_number = 0
+
+    def _submit(self, status='pending'):
+        self.kra_invoice_number += 1
+        return KRAInvoiceSubmission.objects.create(
+            company=self.company,
+            credit_note=self.credit_note,
+            kra_invoice_number=self.kra_invoice_number,
+            trd_invoice_no='CN-1',
+            document_type='credit_note',
+            submitted_data={},
+            status=status,
+        )
+
+    def _is_kra_validated(self):
+        return CreditNote.objects.values_list('is_kra_validated', flat=True).get(pk=self.credit_note.pk)
+
+    def test_validated_submission_marks_credit_note(self):
+        self._submit(status='success')
+
+        self.assertTrue(self._is_kra_validated())
+
+    def test_pending_submission_leaves_credit_note_unvalidated(self):
+        self._submit()
+
+        self.assertFalse(self._is_kra_validated())
+
+    def test_status_change_updates_flag(self):
+        submission = self._submit()
+
+        submission.mark_signed()
+        self.assertTrue(self._is_kra_validated())
+
+        submission.status = 'cancelled'
+        submission.save(update_fields=['status'])
+        self.assertFalse(self._is_kra_validated())
+
+    def test_save_without_status_skips_refresh(self):
+        submission = self._submit()
+        CreditNote.objects.filter(pk=self.credit_note.pk).update(is_kra_validated=True)
+
+        submission.error_message = 'timeout'
+        submission.save(update_fields=['error_message'])
+
+        self.assertTrue(self._is_kra_validated())
+
+    def test_deleting_last_validated_submission_clears_flag(self):
+        first = self._submit(status='success')
+        second = self._submit(status='signed')
+
+        first.delete()
+        self.assertTrue(self._is_kra_validated())
+
+        second.delete()
+        self.assertFalse(self._is_kra_validated())
+
+    def test_migration_backfill_derives_flag_from_submissions(self):
+        self._submit(status='success')
+        unsubmitted = CreditNote.objects.create(
+            company=self.company,
+            qb_credit_id='2',
+            doc_number='CN-2',
+            txn_date=datetime.date(2024, 1, 3),
+            total_amt=Decimal('10.00'),
+            sync_token='0',
+        )
+        CreditNote.objects.update(is_kra_validated=False)
+        CreditNote.objects.filter(pk=unsubmitted.pk).update(is_kra_validated=True)
+
+        backfill_kra_validated(apps, None)
+
+        self.assertTrue(self._is_kra_validated())
+        unsubmitted.refresh_from_db()
+        self.assertFalse(unsubmitted.is_kra_validated)
@@ -885,7 +885,7 @@ class UserCompaniesView(APIView):
         # Get user's active company
         try:
             active_company = ActiveCompany.objects.get(user=request.user)
-            active_company_id = str(active_company.company.id)
+            active_company_id = str(active_company.company_id)
         except ActiveCompany.DoesNotExist:
             pass
 